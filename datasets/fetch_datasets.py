@@ -0,0 +1,262 @@
+'''
+  @file fetch_datasets.py
+
+  Fetch, verify and prepare the datasets listed in the dataset manifest.
+'''
+
+import os, sys, inspect, argparse, yaml, logging, glob, shutil, tarfile
+import fnmatch, tempfile, urllib.request, concurrent.futures
+
+# Import the util path, this method even works if the path contains
+# symlinks to modules.
+cmd_subfolder = os.path.realpath(os.path.abspath(os.path.join(
+  os.path.split(inspect.getfile(inspect.currentframe()))[0], '../util')))
+if cmd_subfolder not in sys.path:
+  sys.path.insert(0, cmd_subfolder)
+
+from util import file_checksum, load_csv
+
+'''
+Read the given manifest.
+
+@return Tuple of the comment lines at the top of the file and the entries.
+'''
+def read_manifest(path):
+  with open(path, "r") as fid:
+    text = fid.read()
+
+  header = []
+  for line in text.splitlines():
+    if not line.startswith("#"):
+      break
+    header.append(line)
+  return header, yaml.safe_load(text) or {}
+
+'''
+The yaml dumper of the manifest, which writes the lists (the shapes) inline.
+'''
+class ManifestDumper(yaml.SafeDumper):
+  pass
+
+ManifestDumper.add_representer(list, lambda dumper, data:
+  dumper.represent_sequence("tag:yaml.org,2002:seq", data, flow_style=True))
+
+'''
+Write the given entries with the given comment lines into the manifest.
+'''
+def write_manifest(path, header, entries):
+  blocks = [yaml.dump({name: entries[name]}, Dumper=ManifestDumper,
+    default_flow_style=False, sort_keys=False) for name in entries]
+  with open(path + ".tmp", "w") as fid:
+    fid.write("\n".join(header) + "\n\n" + "\n".join(blocks))
+  os.replace(path + ".tmp", path)
+
+'''
+This class fetches the archives of the manifest entries (from the url or from
+a local mirror directory), verifies their checksums, extracts them atomically
+into the dataset directory and parses the extracted csv files into the binary
+dataset cache (see load_csv()).
+'''
+class DatasetManager(object):
+
+  '''
+  @param directory - The dataset directory.
+  @param mirror - Directory with copies of the archives, which is used instead
+                  of the urls, or None.
+  @param force - Fetch the entries even if their files exist.
+  '''
+  def __init__(self, directory, mirror=None, force=False):
+    self.directory = directory
+    self.mirror = mirror
+    self.force = force
+
+  '''
+  Return the extracted files of the given entry.
+  '''
+  def files(self, entry):
+    return sorted(os.path.basename(path) for path in
+      glob.glob(os.path.join(self.directory, entry["files"])))
+
+  '''
+  Return the list of problems of the extracted files of the given entry, which
+  is empty if all files exist and match the recorded checksums.
+  '''
+  def verify(self, entry):
+    files = self.files(entry)
+    if not files:
+      return ["no files matching %s" % entry["files"]]
+
+    problems = []
+    for name, expected in (entry.get("contents") or {}).items():
+      path = os.path.join(self.directory, name)
+      if not os.path.isfile(path):
+        problems.append("%s is missing" % name)
+      elif expected.get("sha256") and file_checksum(path) != expected["sha256"]:
+        problems.append("checksum of %s doesn't match" % name)
+    return problems
+
+  '''
+  Fetch, verify, extract and prepare the given entry, unless its files exist
+  and match the recorded checksums.
+
+  @return Tuple of the checksum of the fetched archive (None if the entry was
+          up to date) and the contents (checksum, shape and dtype of every
+          extracted file).
+  '''
+  def fetch(self, name, entry):
+    checksum = None
+    problems = self.verify(entry)
+    if problems or self.force:
+      if problems:
+        logging.info('%s: %s, fetching %s.' % (name, problems[0],
+          entry["url"]))
+      archive, checksum = self.download(name, entry)
+      try:
+        self.extract(name, entry, archive)
+      finally:
+        os.remove(archive)
+
+      problems = self.verify(entry)
+      if problems:
+        raise Exception("; ".join(problems))
+    else:
+      logging.info('%s: up to date.' % name)
+
+    return checksum, self.prepare(entry)
+
+  '''
+  Copy the archive of the given entry from the mirror or download it into a
+  temporary file and verify its checksum.
+
+  @return Tuple of the path of the temporary file and its checksum.
+  '''
+  def download(self, name, entry):
+    fd, path = tempfile.mkstemp(dir=self.directory, prefix="." + name,
+      suffix=".tar.gz")
+    try:
+      with os.fdopen(fd, "wb") as fid:
+        source = os.path.join(self.mirror, os.path.basename(entry["url"])) \
+          if self.mirror else None
+        if source:
+          with open(source, "rb") as mirror:
+            shutil.copyfileobj(mirror, fid, 1 << 20)
+        else:
+          url = entry["url"]
+          if "://" not in url:
+            url = "http://" + url
+          with urllib.request.urlopen(url) as response:
+            shutil.copyfileobj(response, fid, 1 << 20)
+
+      checksum = file_checksum(path)
+      if entry.get("sha256") and checksum != entry["sha256"]:
+        raise Exception("checksum of %s doesn't match" % entry["url"])
+    except:
+      os.remove(path)
+      raise
+
+    return path, checksum
+
+  '''
+  Extract the given archive into a temporary directory and move the files
+  matching the pattern of the entry into the dataset directory, so an
+  interrupted extraction never leaves a partial file behind.
+  '''
+  def extract(self, name, entry, archive):
+    staging = tempfile.mkdtemp(dir=self.directory, prefix="." + name)
+    try:
+      with tarfile.open(archive, "r:*") as tar:
+        members = [member for member in tar.getmembers() if member.isfile()
+          and not os.path.isabs(member.name) and ".." not in
+          member.name.split("/")]
+        tar.extractall(staging, members=members)
+
+      for member in members:
+        if fnmatch.fnmatch(os.path.basename(member.name),
+            entry["files"]):
+          os.replace(os.path.join(staging, member.name),
+            os.path.join(self.directory, os.path.basename(member.name)))
+    finally:
+      shutil.rmtree(staging, ignore_errors=True)
+
+  '''
+  Parse the csv files of the given entry into the binary dataset cache.
+
+  @return The contents (checksum, shape and dtype of every file).
+  '''
+  def prepare(self, entry):
+    contents = {}
+    for name in self.files(entry):
+      path = os.path.join(self.directory, name)
+      contents[name] = {"sha256": file_checksum(path)}
+      if name.endswith(".csv"):
+        data = load_csv(path)
+        contents[name]["shape"] = list(data.shape)
+        contents[name]["dtype"] = str(data.dtype)
+    return contents
+
+  '''
+  Fetch the given entries concurrently.
+
+  @param entries - Dict from the entry name to the entry.
+  @param jobs - The number of concurrent fetches.
+  @return Tuple of a dict from the entry name to the result of fetch() and a
+          dict from the entry name to the error message of the failed
+          entries.
+  '''
+  def fetch_all(self, entries, jobs):
+    contents = {}
+    errors = {}
+    with concurrent.futures.ThreadPoolExecutor(max(1, jobs)) as executor:
+      futures = dict((executor.submit(self.fetch, name, entry), name) for
+        name, entry in entries.items())
+      for future in concurrent.futures.as_completed(futures):
+        name = futures[future]
+        try:
+          contents[name] = future.result()
+        except Exception as e:
+          errors[name] = str(e)
+          logging.error('%s: %s' % (name, str(e)))
+    return contents, errors
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(
+    description="""Fetch the datasets listed in the manifest.""")
+  parser.add_argument('names', nargs='*',
+    help='Fetch only the given entries of the manifest.')
+  parser.add_argument('-f','--manifest', default=os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'manifest.yaml'),
+    help='Dataset manifest file name.', required=False)
+  parser.add_argument('-d','--directory', default=os.path.dirname(
+    os.path.abspath(__file__)), help='Dataset directory.', required=False)
+  parser.add_argument('-j','--jobs', type=int, default=4,
+    help='Number of datasets to fetch in parallel.', required=False)
+  parser.add_argument('--mirror',
+    help='Directory with the archives, instead of the urls.', required=False)
+  parser.add_argument('--force', action='store_true',
+    help='Fetch the datasets even if they exist.', required=False)
+  parser.add_argument('--update', action='store_true',
+    help='Record the checksums and shapes in the manifest.', required=False)
+
+  args = parser.parse_args()
+  logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+  header, entries = read_manifest(args.manifest)
+  unknown = [name for name in args.names if name not in entries]
+  if unknown:
+    parser.error('unknown datasets: %s' % ", ".join(unknown))
+
+  selected = dict((name, entries[name]) for name in entries if
+    not args.names or name in args.names)
+  manager = DatasetManager(args.directory, args.mirror, args.force)
+  contents, errors = manager.fetch_all(selected, args.jobs)
+
+  if args.update:
+    for name, (checksum, files) in contents.items():
+      if checksum:
+        entries[name]["sha256"] = checksum
+      entries[name]["contents"] = files
+    write_manifest(args.manifest, header, entries)
+
+  logging.info('%d datasets fetched, %d failed.' % (len(contents),
+    len(errors)))
+  sys.exit(1 if errors else 0)
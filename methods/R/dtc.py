@@ -13,6 +13,7 @@ if cmd_subfolder not in sys.path:
   sys.path.insert(0, cmd_subfolder)
 
 from util import *
+from session import *
 
 '''
 This class implements the Decision Tree benchmark.
@@ -32,8 +33,9 @@ class R_DTC(object):
         "minimum_samples_split"])
 
     # Split the command using shell-like syntax.
-    self.cmd = shlex.split("libraries/bin/Rscript " + run_param["r_path"] +
-      "dtc.r" + " -t " + self.dataset[0] + " -T " + self.dataset[1] + " -md " +
+    self.cmd = shlex.split(run_param["r_bin_path"] + "Rscript " +
+      run_param["r_path"] + "dtc.r" +
+      " -t " + self.dataset[0] + " -T " + self.dataset[1] + " -md " +
       str(self.build_opts["max_depth"]) + " -ms " +
       str(self.build_opts["min_samples_split"]) )
 
@@ -46,23 +48,19 @@ class R_DTC(object):
 
   def metric(self):
     try:
-      self.output = subprocess.check_output(self.cmd, stderr=subprocess.STDOUT,
-        shell=False, timeout=self.timeout)
+      self.output = run_r(self.cmd, self.timeout)
     except subprocess.TimeoutExpired as e:
       raise Exception("method timeout")
     except Exception as e:
       subprocess_exception(e, self.output)
 
     metric = {}
-    metric["runtime"] = float(re.findall("(\d+\.\d+). *sec elapsed",
-      self.output.decode("utf-8"))[0])
+    metric["runtime"] = r_runtime(self.output)
 
     if len(self.dataset) == 3:
-      predictions = load_dataset("predictions.csv", ["csv"])[0]
-      predictions = predictions[1:]
+      predictions = r_predictions()
       true_labels = load_dataset(self.dataset[2], ["csv"])[0]
 
-      confusionMatrix = Metrics.ConfusionMatrix(true_labels, predictions)
-      metric['MSE'] = Metrics.SimpleMeanSquaredError(true_labels, predictions)
+      metric.update(Metrics.Evaluate(true_labels, predictions))
 
     return metric
@@ -13,6 +13,7 @@ if cmd_subfolder not in sys.path:
   sys.path.insert(0, cmd_subfolder)
 
 from util import *
+from session import *
 
 '''
 This class implements the Lasso benchmark.
@@ -28,8 +29,8 @@ class R_LASSO(object):
       self.build_opts["lambda1"] = float(method_param["lambda1"])
 
     # Split the command using shell-like syntax.
-    self.cmd = shlex.split("libraries/bin/Rscript " + run_param["r_path"] +
-      "lasso.r" + " -t " + self.dataset[0] + " -l " +
+    self.cmd = shlex.split(run_param["r_bin_path"] + "Rscript " +
+      run_param["r_path"] + "lasso.r" + " -t " + self.dataset[0] + " -l " +
       str(self.build_opts["lambda1"]))
 
     self.info = "R_LASSO ("  + str(self.cmd) +  ")"
@@ -41,23 +42,19 @@ class R_LASSO(object):
 
   def metric(self):
     try:
-      self.output = subprocess.check_output(self.cmd, stderr=subprocess.STDOUT,
-        shell=False, timeout=self.timeout)
+      self.output = run_r(self.cmd, self.timeout)
     except subprocess.TimeoutExpired as e:
       raise Exception("method timeout")
     except Exception as e:
       subprocess_exception(e, self.output)
 
     metric = {}
-    metric["runtime"] = float(re.findall("(\d+\.\d+). *sec elapsed",
-      self.output.decode("utf-8"))[0])
+    metric["runtime"] = r_runtime(self.output)
 
     if len(self.dataset) == 3:
-      predictions = load_dataset("predictions.csv", ["csv"])[0]
-      predictions = predictions[1:]
+      predictions = r_predictions()
       true_labels = load_dataset(self.dataset[2], ["csv"])[0]
 
-      confusionMatrix = Metrics.ConfusionMatrix(true_labels, predictions)
       metric['MSE'] = Metrics.SimpleMeanSquaredError(true_labels, predictions)
 
     return metric
@@ -13,6 +13,7 @@ if cmd_subfolder not in sys.path:
   sys.path.insert(0, cmd_subfolder)
 
 from util import *
+from session import *
 
 '''
 This class implements the QDA benchmark.
@@ -27,8 +28,9 @@ class R_QDA(object):
       self.build_opts["k"] = int(method_param["k"])
 
     # Split the command using shell-like syntax.
-    self.cmd = shlex.split("libraries/bin/Rscript " + run_param["r_path"] +
-      "qda.r" + " -t " + self.dataset[0] + " -T " + self.dataset[1])
+    self.cmd = shlex.split(run_param["r_bin_path"] + "Rscript " +
+      run_param["r_path"] + "qda.r" +
+      " -t " + self.dataset[0] + " -T " + self.dataset[1])
 
     self.info = "R_QDA ("  + str(self.cmd) +  ")"
     self.timeout = run_param["timeout"]
@@ -39,27 +41,19 @@ class R_QDA(object):
 
   def metric(self):
     try:
-      self.output = subprocess.check_output(self.cmd, stderr=subprocess.STDOUT,
-        shell=False, timeout=self.timeout)
+      self.output = run_r(self.cmd, self.timeout)
     except subprocess.TimeoutExpired as e:
       raise Exception("method timeout")
     except Exception as e:
       subprocess_exception(e, self.output)
 
     metric = {}
-    metric["runtime"] = float(re.findall("(\d+\.\d+). *sec elapsed",
-      self.output.decode("utf-8"))[0])
+    metric["runtime"] = r_runtime(self.output)
 
     if len(self.dataset) == 3:
-      predictions = load_dataset("predictions.csv", ["csv"])[0]
-      predictions = predictions[1:]
+      predictions = r_predictions()
       true_labels = load_dataset(self.dataset[2], ["csv"])[0]
 
-      confusionMatrix = Metrics.ConfusionMatrix(true_labels, predictions)
-      metric['ACC'] = Metrics.AverageAccuracy(confusionMatrix)
-      metric['MCC'] = Metrics.MCCMultiClass(confusionMatrix)
-      metric['Precision'] = Metrics.AvgPrecision(confusionMatrix)
-      metric['Recall'] = Metrics.AvgRecall(confusionMatrix)
-      metric['MSE'] = Metrics.SimpleMeanSquaredError(true_labels, predictions)
+      metric.update(Metrics.Evaluate(true_labels, predictions))
 
     return metric
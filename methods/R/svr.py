@@ -13,6 +13,7 @@ if cmd_subfolder not in sys.path:
   sys.path.insert(0, cmd_subfolder)
 
 from util import *
+from session import *
 
 '''
 This class implements the SVR benchmark.
@@ -36,8 +37,9 @@ class R_SVR(object):
     if "gamma" in method_param:
       opts["gamma"] = float(method_param["gamma"])
 
-    self.cmd = shlex.split("libraries/bin/Rscript " + run_param["r_path"] +
-      "svr.r" + " -t " + self.dataset[0] + " -k " + opts['kernel'] + " -c " +
+    self.cmd = shlex.split(run_param["r_bin_path"] + "Rscript " +
+      run_param["r_path"] + "svr.r" +
+      " -t " + self.dataset[0] + " -k " + opts['kernel'] + " -c " +
       str(opts["C"]) + " -e " + str(opts["epsilon"]) + " -g " +
       str(opts["gamma"]))
 
@@ -50,15 +52,13 @@ class R_SVR(object):
 
   def metric(self):
     try:
-      self.output = subprocess.check_output(self.cmd, stderr=subprocess.STDOUT,
-        shell=False, timeout=self.timeout)
+      self.output = run_r(self.cmd, self.timeout)
     except subprocess.TimeoutExpired as e:
       raise Exception("method timeout")
     except Exception as e:
       subprocess_exception(e, self.output)
 
     metric = {}
-    metric["runtime"] = float(re.findall("(\d+\.\d+). *sec elapsed",
-      self.output.decode("utf-8"))[0])
+    metric["runtime"] = r_runtime(self.output)
 
     return metric
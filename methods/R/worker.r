@@ -0,0 +1,88 @@
+# Persistent R worker to execute the benchmark scripts.
+#
+# Every line read from stdin is a request of tab separated fields: the working
+# directory, the path of the script and the command line arguments of the
+# script. The script is executed in a fresh environment, so the packages stay
+# loaded between the requests. The worker writes the elapsed times of the
+# tictoc timers to 'timings.bin' and the predictions of the script to
+# 'predictions.bin' (both little-endian doubles), and terminates the output of
+# every request with a line with '__END__' and the exit status of the request.
+library(mlr)
+library(tictoc)
+
+# The parsed datasets, by file name.
+datasets <- new.env()
+
+# Return the parsed csv file, read the file only if it isn't cached or if it
+# has changed since it was cached.
+cachedReadCsv <- function(file, ...)
+{
+  info <- file.info(file)
+  key <- paste(normalizePath(file), deparse(list(...)), sep = "\t")
+  stamp <- paste(info$size, as.numeric(info$mtime))
+
+  entry <- datasets[[key]]
+  if (is.null(entry) || entry$stamp != stamp)
+  {
+    entry <- list(stamp = stamp, data = utils::read.csv(file, ...))
+    assign(key, entry, envir = datasets)
+  }
+
+  entry$data
+}
+
+# Write the predictions in binary form instead of the csv file.
+writePredictions <- function(x, file = "", ...)
+{
+  if (identical(file, "predictions.csv"))
+  {
+    writeBin(as.numeric(unlist(x)), "predictions.bin", size = 8,
+        endian = "little")
+  }
+  else
+  {
+    utils::write.csv(x, file, ...)
+  }
+}
+
+input <- file("stdin")
+open(input)
+
+while (length(line <- readLines(input, n = 1)) > 0)
+{
+  if (nchar(line) == 0)
+    next
+
+  request <- strsplit(line, "\t", fixed = TRUE)[[1]]
+  scriptArgs <- request[-(1:2)]
+
+  setwd(request[1])
+  unlink(c("timings.bin", "predictions.bin"))
+  tic.clear()
+  tic.clearlog()
+
+  env <- new.env(parent = globalenv())
+  env$commandArgs <- function(trailingOnly = FALSE)
+  {
+    if (trailingOnly) scriptArgs else c("R", "--args", scriptArgs)
+  }
+  env$read.csv <- cachedReadCsv
+  env$write.csv <- writePredictions
+
+  status <- tryCatch(
+  {
+    sys.source(request[2], envir = env)
+    0
+  }, error = function(e)
+  {
+    cat(conditionMessage(e), "\n")
+    1
+  })
+
+  timings <- vapply(tic.log(format = FALSE), function(x) x$toc - x$tic,
+      numeric(1))
+  writeBin(as.numeric(timings), "timings.bin", size = 8, endian = "little")
+
+  cat(sprintf("\n__END__ %d\n", status))
+  flush(stdout())
+}
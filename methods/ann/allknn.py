@@ -47,8 +47,7 @@ class ANN_ALLKNN(object):
 
   def metric(self):
     try:
-      output = subprocess.check_output(self.cmd, stderr=subprocess.STDOUT,
-        shell=True, timeout=self.timeout)
+      output = run_command(self.cmd, self.timeout, shell=True)
     except subprocess.TimeoutExpired as e:
       raise Exception("method timeout")
     except Exception as e:
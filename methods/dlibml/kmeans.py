@@ -40,8 +40,7 @@ class DLIBML_KMEANS(object):
 
   def metric(self):
     try:
-      self.output = subprocess.check_output(self.cmd, stderr=subprocess.STDOUT,
-        shell=True, timeout=self.timeout)
+      self.output = run_command(self.cmd, self.timeout, shell=True)
     except subprocess.TimeoutExpired as e:
       raise Exception("method timeout")
     except Exception as e:
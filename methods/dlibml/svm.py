@@ -55,8 +55,7 @@ class DLIBML_SVM(object):
 
   def metric(self):
     try:
-      self.output = subprocess.check_output(self.cmd, stderr=subprocess.STDOUT,
-        shell=True, timeout=self.timeout)
+      self.output = run_command(self.cmd, self.timeout, shell=True)
     except subprocess.TimeoutExpired as e:
       raise Exception("method timeout")
     except Exception as e:
@@ -68,14 +67,9 @@ class DLIBML_SVM(object):
       metric["runtime"] = timer["runtime"]
 
     if len(self.dataset) > 2:
-      predictions = load_dataset("predictions.csv", ["csv"])[0]
+      predictions = read_csv("predictions.csv")
       true_labels = load_dataset(self.dataset[2], ["csv"])[0]
 
-      confusionMatrix = Metrics.ConfusionMatrix(true_labels, predictions)
-      metric['ACC'] = Metrics.AverageAccuracy(confusionMatrix)
-      metric['MCC'] = Metrics.MCCMultiClass(confusionMatrix)
-      metric['Precision'] = Metrics.AvgPrecision(confusionMatrix)
-      metric['Recall'] = Metrics.AvgRecall(confusionMatrix)
-      metric['MSE'] = Metrics.SimpleMeanSquaredError(true_labels, predictions)
+      metric.update(Metrics.Evaluate(true_labels, predictions))
 
     return metric
@@ -19,6 +19,7 @@ if cmd_subfolder not in sys.path:
   sys.path.insert(0, cmd_subfolder)
 
 from util import *
+from session import *
 
 '''
 This class implements the Principal Components Analysis benchmark.
@@ -42,14 +43,13 @@ class ELKI_PCA(object):
 
   def metric(self):
     try:
-      self.output = subprocess.check_output(self.cmd, stderr=subprocess.STDOUT,
-        shell=False, timeout=self.timeout)
+      self.output = run_java(self.cmd, self.timeout)
     except subprocess.TimeoutExpired as e:
       raise Exception("method timeout")
     except Exception as e:
       subprocess_exception(e, self.output)
 
-    metric = {}
+    metric = parse_jvm_timer(self.output)
     pattern = re.compile(r""".*?datasource[^\s]*\.load:\s*(?P<total_time>\d+)\s*ms.*?""", re.VERBOSE|re.MULTILINE|re.DOTALL)
     match = pattern.match(self.output.decode())
     if match.group("total_time").count(".") == 1:
@@ -15,6 +15,7 @@ if cmd_subfolder not in sys.path:
   sys.path.insert(0, cmd_subfolder)
 
 from util import *
+from session import *
 
 '''
 This class implements the K-Means Clustering benchmark.
@@ -52,15 +53,14 @@ class MATLAB_KMEANS(object):
 
   def metric(self):
     try:
-      self.output = subprocess.check_output(self.cmd, stderr=subprocess.STDOUT,
-        shell=False, timeout=self.timeout)
+      self.output = run_matlab(self.cmd, self.timeout)
     except subprocess.TimeoutExpired as e:
       raise Exception("method timeout")
     except Exception as e:
       subprocess_exception(e, self.output)
 
     metric = {}
-    timer = parse_timer(self.output)
+    timer = parse_matlab_timer(self.output.decode("utf-8"))
     if timer:
       metric["runtime"] = timer["total_time"]
 
@@ -14,6 +14,7 @@ if cmd_subfolder not in sys.path:
   sys.path.insert(0, cmd_subfolder)
 
 from util import *
+from session import *
 
 '''
 This class implements the K-Nearest Classifier benchmark.
@@ -43,27 +44,21 @@ class MATLAB_KNC(object):
 
   def metric(self):
     try:
-      self.output = subprocess.check_output(self.cmd, stderr=subprocess.STDOUT,
-        shell=False, timeout=self.timeout)
+      self.output = run_matlab(self.cmd, self.timeout)
     except subprocess.TimeoutExpired as e:
       raise Exception("method timeout")
     except Exception as e:
       subprocess_exception(e, self.output)
 
     metric = {}
-    timer = parse_timer(self.output)
+    timer = parse_matlab_timer(self.output.decode("utf-8"))
     if timer:
       metric["runtime"] = timer["total_time"]
 
       if len(self.dataset) > 2:
-        predictions = load_dataset("predictions.csv", ["csv"])[0]
+        predictions = read_csv("predictions.csv")
         true_labels = load_dataset(self.dataset[2], ["csv"])[0]
 
-        confusionMatrix = Metrics.ConfusionMatrix(true_labels, predictions)
-        metric['ACC'] = Metrics.AverageAccuracy(confusionMatrix)
-        metric['MCC'] = Metrics.MCCMultiClass(confusionMatrix)
-        metric['Precision'] = Metrics.AvgPrecision(confusionMatrix)
-        metric['Recall'] = Metrics.AvgRecall(confusionMatrix)
-        metric['MSE'] = Metrics.SimpleMeanSquaredError(true_labels, predictions)
+        metric.update(Metrics.Evaluate(true_labels, predictions))
 
     return metric
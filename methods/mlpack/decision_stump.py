@@ -37,8 +37,7 @@ class MLPACK_DECISIONSTUMP(object):
 
   def metric(self):
     try:
-      self.output = subprocess.check_output(self.cmd, stderr=subprocess.STDOUT,
-        shell=False, timeout=self.timeout)
+      self.output = run_command(self.cmd, self.timeout)
     except subprocess.TimeoutExpired as e:
       raise Exception("method timeout")
     except Exception as e:
@@ -53,18 +52,9 @@ class MLPACK_DECISIONSTUMP(object):
         metric["runtime"] -= timer["saving_data"]
 
     if len(self.dataset) >= 3:
-        predictions = load_dataset("output.csv", ["csv"])[0]
+        predictions = read_csv("output.csv")
         true_labels = load_dataset(self.dataset[2], ["csv"])[0]
 
-        confusionMatrix = Metrics.ConfusionMatrix(true_labels, predictions)
-        metric['Precision'] = Metrics.AvgPrecision(confusionMatrix)
-        metric['Recall'] = Metrics.AvgRecall(confusionMatrix)
-        metric['FMeasure'] = Metrics.AvgFMeasure(confusionMatrix)
-        metric['Lift'] = Metrics.LiftMultiClass(confusionMatrix)
-        metric['MCC'] = Metrics.MCCMultiClass(confusionMatrix)
-        metric['Information'] = Metrics.AvgMPIArray(
-          confusionMatrix, true_labels, predictions)
-        metric['MSE'] = Metrics.SimpleMeanSquaredError(
-          true_labels, predictions)
+        metric.update(Metrics.Evaluate(true_labels, predictions))
 
     return metric
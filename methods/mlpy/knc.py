@@ -49,11 +49,6 @@ class MLPY_KNC(object):
     metric["runtime"] = totalTimer.ElapsedTime()
 
     if len(self.data) == 3:
-      confusionMatrix = Metrics.ConfusionMatrix(self.data[2], predictions)
-      metric['ACC'] = Metrics.AverageAccuracy(confusionMatrix)
-      metric['MCC'] = Metrics.MCCMultiClass(confusionMatrix)
-      metric['Precision'] = Metrics.AvgPrecision(confusionMatrix)
-      metric['Recall'] = Metrics.AvgRecall(confusionMatrix)
-      metric['MSE'] = Metrics.SimpleMeanSquaredError(self.data[2], predictions)
+      metric.update(Metrics.Evaluate(self.data[2], predictions))
 
     return metric
@@ -15,14 +15,20 @@ if cmd_subfolder not in sys.path:
   sys.path.insert(0, cmd_subfolder)
 
 from util import *
+from session import *
 
 '''
 This class implements the All K-Nearest-Neighbors benchmark.
 '''
 class WEKA_ALLKNN(object):
+  # The datasets are converted into arff files before the benchmark.
+  formats = ["arff"]
+  nominal_class = False
+
   def __init__(self, method_param, run_param):
     # Assemble run command.
-    dataset = check_dataset(method_param["datasets"], ["arff"])
+    dataset = check_dataset(method_param["datasets"], self.formats,
+      self.nominal_class)
     if len(dataset) == 2:
       input_cmd = "-r " + dataset[0] + " -q " + dataset[1] + " "
     else:
@@ -35,7 +41,8 @@ class WEKA_ALLKNN(object):
       options += " -s " + str(method_param["seed"])
 
     self.cmd = shlex.split("java -classpath " + run_param["weka_path"] +
-      "/weka.jar" + ":methods/weka" + " AllKnn " + input_cmd + " " + options)
+      "/weka.jar:" + run_param["weka_class_path"] +
+      " AllKnn " + input_cmd + " " + options)
 
     self.info = "WEKA_ALLKNN (" + str(self.cmd) + ")"
     self.timeout = run_param["timeout"]
@@ -46,14 +53,13 @@ class WEKA_ALLKNN(object):
 
   def metric(self):
     try:
-      self.output = subprocess.check_output(self.cmd, stderr=subprocess.STDOUT,
-        shell=False, timeout=self.timeout)
+      self.output = run_java(self.cmd, self.timeout)
     except subprocess.TimeoutExpired as e:
       raise Exception("method timeout")
     except Exception as e:
       subprocess_exception(e, self.output)
 
-    metric = {}
+    metric = parse_jvm_timer(self.output)
     timer = parse_timer(self.output)
     if timer:
       metric['runtime'] = timer["total_time"]
@@ -15,21 +15,28 @@ if cmd_subfolder not in sys.path:
   sys.path.insert(0, cmd_subfolder)
 
 from util import *
+from session import *
 
 '''
 This class implements the K-Means Clustering benchmark.
 '''
 class WEKA_KMEANS(object):
+  # The datasets are converted into arff files before the benchmark.
+  formats = ["arff"]
+  nominal_class = False
+
   def __init__(self, method_param, run_param):
     # Assemble run command.
-    self.dataset = check_dataset(method_param["datasets"], ["arff"])
+    self.dataset = check_dataset(method_param["datasets"], self.formats,
+      self.nominal_class)
 
     options = ""
     if "clusters" in method_param:
       options = "-c " + str(method_param["clusters"])
 
     self.cmd = shlex.split("java -classpath " + run_param["weka_path"] +
-      "/weka.jar:methods/weka KMeans -i " + self.dataset[0] + " " + options)
+      "/weka.jar:" + run_param["weka_class_path"] +
+      " KMeans -i " + self.dataset[0] + " " + options)
 
     self.info = "WEKA_KMEANS (" + str(self.cmd) + ")"
     self.timeout = run_param["timeout"]
@@ -40,14 +47,13 @@ class WEKA_KMEANS(object):
 
   def metric(self):
     try:
-      self.output = subprocess.check_output(self.cmd, stderr=subprocess.STDOUT,
-        shell=False, timeout=self.timeout)
+      self.output = run_java(self.cmd, self.timeout)
     except subprocess.TimeoutExpired as e:
       raise Exception("method timeout")
     except Exception as e:
       subprocess_exception(e, self.output)
 
-    metric = {}
+    metric = parse_jvm_timer(self.output)
     timer = parse_timer(self.output)
     if timer:
       metric['runtime'] = timer["total_time"]
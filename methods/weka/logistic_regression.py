@@ -15,14 +15,20 @@ if cmd_subfolder not in sys.path:
   sys.path.insert(0, cmd_subfolder)
 
 from util import *
+from session import *
 
 '''
 This class implements the Logistic Regression benchmark.
 '''
 class WEKA_LOGISTICREGRESSION(object):
+  # The datasets are converted into arff files before the benchmark.
+  formats = ["arff"]
+  nominal_class = False
+
   def __init__(self, method_param, run_param):
     # Assemble run command.
-    self.dataset = check_dataset(method_param["datasets"], ["arff"])
+    self.dataset = check_dataset(method_param["datasets"], self.formats,
+      self.nominal_class)
 
     options = ""
     if "max_iterations" in method_param:
@@ -30,7 +36,7 @@ class WEKA_LOGISTICREGRESSION(object):
 
     # Split the command using shell-like syntax.
     self.cmd = shlex.split("java -classpath " + run_param["weka_path"] +
-      "/weka.jar" + ":methods/weka" + " LogisticRegression -t " +
+      "/weka.jar:" + run_param["weka_class_path"] + " LogisticRegression -t " +
       self.dataset[0] + " -T " + self.dataset[1] + options)
 
     self.info = "WEKA_LOGISTICREGRESSION (" + str(self.cmd) + ")"
@@ -42,22 +48,20 @@ class WEKA_LOGISTICREGRESSION(object):
 
   def metric(self):
     try:
-      self.output = subprocess.check_output(self.cmd, stderr=subprocess.STDOUT,
-        shell=False, timeout=self.timeout)
+      self.output = run_java(self.cmd, self.timeout)
     except subprocess.TimeoutExpired as e:
       raise Exception("method timeout")
     except Exception as e:
       subprocess_exception(e, self.output)
 
-    metric = {}
+    metric = parse_jvm_timer(self.output)
     timer = parse_timer(self.output)
     if timer:
       metric['runtime'] = timer["total_time"]
 
     if len(self.dataset) >= 3:
-        predictions = load_dataset("weka_predicted.csv", ["csv"])[0]
+        predictions = read_csv("weka_predicted.csv")
         true_labels = load_dataset(self.dataset[2], ["csv"])[0]
-        metric['MSE'] = Metrics.SimpleMeanSquaredError(
-          true_labels, predictions)
+        metric.update(Metrics.Evaluate(true_labels, predictions))
 
     return metric
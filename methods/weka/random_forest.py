@@ -13,14 +13,21 @@ if cmd_subfolder not in sys.path:
   sys.path.insert(0, cmd_subfolder)
 
 from util import *
+from session import *
 
 '''
 This class implements the Random Forest benchmark.
 '''
 class WEKA_RANDOMFOREST(object):
+  # The datasets are converted into arff files before the benchmark, with the
+  # last column of the training set as nominal class attribute.
+  formats = ["arff"]
+  nominal_class = True
+
   def __init__(self, method_param, run_param):
     # Assemble run command.
-    self.dataset = check_dataset(method_param["datasets"], ["arff"])
+    self.dataset = check_dataset(method_param["datasets"], self.formats,
+      self.nominal_class)
 
     opts = {}
     opts["minimum_leaf_size"] = 1
@@ -28,7 +35,8 @@ class WEKA_RANDOMFOREST(object):
       opts["minimum_leaf_size"] = int(method_param["minimum_leaf_size"]);
 
     self.cmd = shlex.split("java -classpath " + run_param["weka_path"] +
-      "/weka.jar" + ":methods/weka" + " RANDOMFOREST -t " + self.dataset[0] +
+      "/weka.jar:" + run_param["weka_class_path"] +
+      " RANDOMFOREST -t " + self.dataset[0] +
       " -T " + self.dataset[1] + " -M " + str(opts["minimum_leaf_size"]) )
 
     self.info = "WEKA_RANDOMFOREST (" + str(self.cmd) + ")"
@@ -40,23 +48,21 @@ class WEKA_RANDOMFOREST(object):
 
   def metric(self):
     try:
-      self.output = subprocess.check_output(self.cmd, stderr=subprocess.STDOUT,
-        shell=False, timeout=self.timeout)
+      self.output = run_java(self.cmd, self.timeout)
     except subprocess.TimeoutExpired as e:
       raise Exception("method timeout")
     except Exception as e:
       subprocess_exception(e, self.output)
 
-    metric = {}
+    metric = parse_jvm_timer(self.output)
     timer = parse_timer(self.output)
     if timer:
       metric['runtime'] = timer["total_time"]
 
     if len(self.dataset) >= 3:
-        predictions = load_dataset("weka_predicted.csv", ["csv"])[0]
+        predictions = read_csv("weka_predicted.csv")
         true_labels = load_dataset(self.dataset[2], ["csv"])[0]
 
-        metric['MSE'] = Metrics.SimpleMeanSquaredError(
-          true_labels, predictions)
+        metric.update(Metrics.Evaluate(true_labels, predictions))
 
     return metric
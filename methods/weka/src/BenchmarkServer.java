@@ -0,0 +1,92 @@
+/**
+ * @file BenchmarkServer.java
+ *
+ * Persistent JVM to execute the benchmark classes.
+ */
+
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.util.Arrays;
+import java.util.HashMap;
+import java.util.Locale;
+
+/**
+ * This class keeps a JVM alive to execute the main method of the benchmark
+ * classes (e.g. the weka benchmark classes or the ELKI launcher) on request,
+ * so the JVM startup, class loading and JIT warm-up is paid only once.
+ *
+ * Every line read from stdin is a request of tab separated fields: the number
+ * of warm-up executions, the name of the class and the arguments of its main
+ * method. The main method is executed warm-up + 1 times and the output of the
+ * last execution is written to stdout, followed by the cold time (the first
+ * execution of the class in this JVM) and the steady-state time (the last
+ * execution) and a line with '__END__' and the exit status of the request.
+ */
+public class BenchmarkServer {
+
+  public static void main(String args[]) throws Exception {
+    PrintStream out = System.out;
+    PrintStream err = System.err;
+    BufferedReader in = new BufferedReader(new InputStreamReader(System.in));
+    HashMap<String, Long> coldTimes = new HashMap<String, Long>();
+
+    String line;
+    while ((line = in.readLine()) != null) {
+      if (line.length() == 0)
+        continue;
+
+      String[] request = line.split("\t", -1);
+      ByteArrayOutputStream buffer = new ByteArrayOutputStream();
+      PrintStream capture = new PrintStream(buffer, true);
+      int status = 0;
+      long steadyTime = 0;
+
+      System.setOut(capture);
+      System.setErr(capture);
+      try {
+        int warmup = Integer.parseInt(request[0]);
+        String className = request[1];
+        Method method = Class.forName(className).getMethod("main",
+            String[].class);
+
+        for (int i = 0; i <= warmup; i++) {
+          buffer.reset();
+
+          // The classes remove the parsed options from the argument array.
+          String[] classArgs = Arrays.copyOfRange(request, 2, request.length);
+          long start = System.nanoTime();
+          method.invoke(null, (Object) classArgs);
+          steadyTime = System.nanoTime() - start;
+
+          if (!coldTimes.containsKey(className))
+            coldTimes.put(className, steadyTime);
+        }
+
+        capture.printf("jvm\n");
+        capture.printf(Locale.ROOT, "[INFO ]   jvm_cold_time: %fs\n",
+            coldTimes.get(className) / 1e9);
+        capture.printf(Locale.ROOT, "[INFO ]   jvm_steady_time: %fs\n",
+            steadyTime / 1e9);
+      } catch (InvocationTargetException e) {
+        e.getCause().printStackTrace(capture);
+        status = 1;
+      } catch (Exception e) {
+        e.printStackTrace(capture);
+        status = 1;
+      } finally {
+        System.setOut(out);
+        System.setErr(err);
+      }
+
+      capture.flush();
+      out.print(buffer.toString());
+      out.println();
+      out.println("__END__ " + status);
+      out.flush();
+    }
+  }
+}
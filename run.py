@@ -5,7 +5,8 @@
   Perform the benchmark.
 '''
 
-import os, sys, inspect, argparse, yaml, logging
+import os, sys, inspect, argparse, yaml, logging, itertools, numbers
+import multiprocessing
 
 # Import the util path, this method even works if the path contains
 # symlinks to modules.
@@ -15,9 +16,265 @@ if cmd_subfolder not in sys.path:
   sys.path.insert(0, cmd_subfolder)
 
 from util import *
+from scheduler import Scheduler, order_by_cost, predict_makespan, \
+  format_duration
+from session import configure_sessions, start_sessions, shutdown_sessions
+from writer import ResultWriter
+from journal import Journal
+from fingerprint import Fingerprint, ResultCache
+from cluster import Coordinator, work, cluster_token
+from timeouts import TimeoutPolicy, block_timeout
+from scaling import expand_scaling, prepare_scaling, ScalingReport
+from synthetic import resolve_datasets
+from shared import SharedDatasets
 
-def run(config, library, methods, loglevel):
-  # Configure logging.
+'''
+Expand the given config into the list of benchmark runs, one run for every
+block, parameter set and dataset.
+'''
+def expand_plan(config, library, methods, base_param):
+  plan = []
+
+  stream = open(config, "r")
+  method_config = yaml.load_all(stream)
+  for method in method_config:
+    name, values = method.popitem()
+
+    # Skip unspecified libraries, unless the user didn't specify any.
+    if library is not None and values["library"].lower() != library.lower():
+      continue
+
+    # Skip unspecified methods, unless the user didn't specify any.
+    if methods is not None and values["method"].lower() != methods.lower():
+      continue
+
+    if "metric" not in values["run"]:
+      continue
+
+    values["param"] = param_extension(values["param"])
+
+    # The block options override the trial options of the base config.
+    trial_param = {}
+    for key in ["warmup", "trials", "confidence", "trial_budget"]:
+      trial_param[key] = values.get(key, base_param.get(key))
+
+    for method_param in values["param"]:
+      method_param.pop("options", None)
+
+      for dataset in values["datasets"]:
+        datasets = dataset if isinstance(dataset, (list,)) else [dataset]
+
+        # A block with the 'scaling' option runs on subsamples of the datasets.
+        scalings = [None]
+        if values.get("scaling"):
+          try:
+            scalings = expand_scaling(datasets, values["scaling"])
+          except Exception as e:
+            logging.error('Scaling %s on %s: %s' % (name, str(datasets),
+              str(e)))
+            continue
+
+        for scaling in scalings:
+          run_param = copy.deepcopy(method_param)
+          run_param["datasets"] = \
+            prepare_scaling(scaling) if scaling else datasets
+
+          task = {"name": name, "library": values["library"],
+            "version": str(values.get("version", "")),
+            "method": values["method"], "script": values["script"],
+            "method_param": run_param,
+            "cores": values.get("cores", base_param.get("cores", 1)),
+            "timeout": block_timeout(values, datasets, base_param),
+            "trial_param": trial_param}
+          if scaling:
+            task["scaling"] = scaling
+          plan.append(task)
+
+  return plan
+
+'''
+Convert the datasets of the plan into the formats required by the scripts (the
+'formats' and 'nominal_class' attributes of the script classes) before the
+benchmark, in parallel across the files, so the conversion isn't part of the
+runs.
+'''
+def prepare_datasets(plan, jobs):
+  classes = {}
+  conversions = set()
+  for task in plan:
+    key = (task["script"], task["name"])
+    if key not in classes:
+      try:
+        module = Loader.ImportModuleFromPath(task["script"])
+        classes[key] = getattr(module, task["name"])
+      except Exception as e:
+        logging.warning('Dataset preparation: %s: %s' % (task["script"],
+          str(e)))
+        classes[key] = None
+
+    formats = getattr(classes[key], "formats", None) or []
+    if "arff" not in formats:
+      continue
+
+    nominal_class = bool(getattr(classes[key], "nominal_class", False))
+    for position, dataset in enumerate(task["method_param"]["datasets"]):
+      if os.path.splitext(dataset)[1][1:] not in formats:
+        conversions.add((dataset, nominal_class and position == 0))
+
+  if not conversions:
+    return
+
+  logging.info('Dataset preparation: %d arff files.' % len(conversions))
+  conversions = sorted(conversions)
+  if jobs > 1:
+    pool = multiprocessing.get_context("fork").Pool(min(jobs,
+      len(conversions)))
+    try:
+      results = pool.map(prepare_dataset, conversions)
+    finally:
+      pool.close()
+      pool.join()
+  else:
+    results = [prepare_dataset(conversion) for conversion in conversions]
+
+  for (dataset, nominal_class), error in zip(conversions, results):
+    if error:
+      logging.error('Dataset preparation: %s: %s' % (dataset, error))
+
+'''
+Convert a single dataset and return the error message or None.
+'''
+def prepare_dataset(conversion):
+  try:
+    dataset = resolve_datasets(conversion[0])
+    export_csv(dataset)
+    if os.path.isfile(dataset):
+      prepare_arff(dataset, conversion[1])
+  except Exception as e:
+    return str(e)
+
+'''
+Call the metric method of the given instance repeatedly, according to the
+trial parameters:
+
+  warmup       - Number of calls before the measurement, their results are
+                 discarded.
+  trials       - Number of measured calls; if 'confidence' is set this is the
+                 maximum number of calls.
+  confidence   - Stop as soon as the width of the 95% confidence interval of
+                 the runtime, relative to the mean runtime, is below this value.
+  trial_budget - Stop the measurement after this number of seconds.
+'''
+def run_trials(instance, trial_param):
+  trials = max(1, int(trial_param.get("trials") or 1))
+  confidence = float(trial_param.get("confidence") or 0)
+  budget = float(trial_param.get("trial_budget") or 0)
+
+  for i in range(int(trial_param.get("warmup") or 0)):
+    instance.metric()
+
+  results = []
+  start = time.perf_counter()
+  while True:
+    with ResourceMonitor() as monitor:
+      result = instance.metric()
+    logging.info('Metric: %s' % (str(result)))
+
+    # Store the resources used by the metric method alongside its metrics.
+    if result:
+      for key, value in monitor.Metric().items():
+        result.setdefault(key, value)
+    results.append(result)
+
+    if len(results) >= trials:
+      break
+
+    if confidence > 0 and len(results) >= 3 and \
+        all("runtime" in r for r in results) and \
+        confidence_width([r["runtime"] for r in results]) <= confidence:
+      break
+
+    if budget > 0 and time.perf_counter() - start >= budget:
+      break
+
+  return combine_trials(results)
+
+'''
+Execute a single run of the plan and return the (status, result) tuple, where
+status is one of 'ok', 'timeout' or 'error'.
+'''
+def execute(task, base_param):
+  logging.info('Script: %s' % (task["script"]))
+
+  # The scripts pass the timeout of the run to their subprocesses.
+  base_param = dict(base_param)
+  base_param["timeout"] = task.get("timeout", base_param["timeout"])
+
+  try:
+    # The subsamples of a scaling run may not exist on a remote worker.
+    if "scaling" in task:
+      prepare_scaling(task["scaling"])
+
+    module = Loader.ImportModuleFromPath(task["script"])
+    method_call = getattr(module, task["name"])
+
+    # The synthetic datasets are generated unless they exist, and the paths
+    # have to be absolute since the run is executed inside of its own scratch
+    # directory.
+    method_param = dict(task["method_param"])
+    method_param["datasets"] = resolve_datasets(method_param["datasets"])
+    method_param = absolute_param(method_param)
+    run_param = absolute_param(base_param)
+    configure_sessions(run_param)
+
+    @timeout_decorator.timeout(base_param["timeout"], use_signals=True)
+    def run_timeout_wrapper():
+      with ScratchDirectory(scratch_root(base_param)):
+        instance = method_call(method_param, run_param)
+        logging.info('Run: %s' % (str(instance)))
+
+        # Run the metric method.
+        result = run_trials(instance, task["trial_param"])
+
+      logging.info('Dataset cache: %s' % (str(dataset_cache)))
+
+      if len(result.keys()) <= 0:
+        logging.error('No metric results.')
+
+      return result
+
+    return ("ok", run_timeout_wrapper())
+  except timeout_decorator.TimeoutError as e:
+    logging.warning('Timeout: %s' % (str(e)))
+    return ("timeout", None)
+  except Exception as e:
+    logging.error('Exception: %s' % (str(e)))
+    return ("error", None)
+
+'''
+Return the expected runtime of the given run: the runtime of its latest result
+in the database of the output driver or the runtime recorded in the journal
+(where a timeout counts as the timeout), whichever is longer, or None if the
+run was never executed.
+'''
+def expected_runtime(task, driver, journal):
+  costs = [journal.runtime(task)]
+  if hasattr(driver, "time_series"):
+    try:
+      history = driver.time_series(task["library"], task["method"],
+        task["method_param"]["datasets"], task["method_param"])
+      if history:
+        costs.append(history[-1][1])
+    except Exception as e:
+      logging.warning('No runtime history: %s' % (str(e)))
+
+  costs = [cost for cost in costs if cost is not None]
+  return max(costs) if costs else None
+
+'''
+Configure the logging with the given loglevel.
+'''
+def configure_logging(loglevel):
   if loglevel and loglevel.upper() == "CRITICAL":
     logginglevel = logging.CRITICAL
   elif loglevel and loglevel.upper() == "ERROR":
@@ -31,6 +288,38 @@ def run(config, library, methods, loglevel):
 
   logging.basicConfig(level=logginglevel, format='[%(levelname)s] %(message)s')
 
+'''
+Execute the runs handed out by the coordinator at the given address, with the
+settings of the local base.yaml.
+'''
+def run_worker(address, loglevel, jobs=1):
+  configure_logging(loglevel)
+
+  token = cluster_token()
+  if not token:
+    logging.error('Set the token of the coordinator in the '
+      'BENCHMARK_CLUSTER_TOKEN environment variable.')
+    return
+
+  stream = open("base.yaml", "r")
+  base_param = list(yaml.load_all(stream))[0]
+
+  start_sessions()
+  dataset_cache.configure(int(base_param.get("dataset_cache", 0)) * 1024 * 1024)
+  shared = SharedDatasets(int(base_param.get("shared_datasets", 0)) * 1024 *
+    1024)
+
+  try:
+    work(address, jobs, lambda task: execute(task, base_param),
+      base_param.get("worker_wait", 60), shared, token)
+  finally:
+    shutdown_sessions()
+    shared.close()
+
+def run(config, library, methods, loglevel, jobs=1, resume=False,
+    rerun_failed=False, coordinator=None):
+  configure_logging(loglevel)
+
   stream = open("base.yaml", "r")
   base_param = list(yaml.load_all(stream))[0]
 
@@ -38,67 +327,146 @@ def run(config, library, methods, loglevel):
   driver_param = list(yaml.load_all(stream))[0]
 
   # Configure output driver.
+  driver = None
   if "output_driver" in driver_param:
     module = Loader.ImportModuleFromPath(driver_param["output_driver"])
     driver = getattr(module, "Driver")(driver_param)
 
-  stream = open(config, "r")
-  method_config = yaml.load_all(stream)
-  for method in method_config:
-    name, values = method.popitem()
+    # The results are written by a background thread, the spool file keeps the
+    # results until they are written.
+    writer = ResultWriter(driver, driver_param.get("spool_file",
+      "benchmarks.spool"), driver_param.get("writer_queue", 64))
 
-    # Skip unspecified libraries, unless the user didn't specify any.
-    if library is not None and values["library"].lower() != library.lower():
-      continue
+  # The persistent interpreter sessions started by the runs of this invocation
+  # listen in a private directory of the runner.
+  start_sessions()
 
-    # Skip unspecified methods, unless the user didn't specify any.
-    if methods is not None and values["method"].lower() != methods.lower():
-      continue
+  # The dataset cache and shared datasets budgets are given in megabytes.
+  dataset_cache.configure(int(base_param.get("dataset_cache", 0)) * 1024 * 1024)
+  shared = SharedDatasets(int(base_param.get("shared_datasets", 0)) * 1024 *
+    1024)
 
-    values["param"] = param_extension(values["param"])
+  plan = expand_plan(config, library, methods, base_param)
 
-    for method_param in values["param"]:
-      method_param.pop("options")
+  # A resumed invocation continues the build of the last invocation and only
+  # executes the runs that aren't done (or that failed) in that build.
+  journal = Journal(base_param.get("journal_file", "benchmarks.journal"))
+  # Without an output driver, the builds are numbered by the journal.
+  build = driver.build if driver else (journal.last_build() or 0) + 1
+  if resume or rerun_failed:
+    if journal.last_build() is not None:
+      build = journal.last_build()
+      if driver:
+        driver.build = build
 
-      for dataset in values["datasets"]:
-        method_param["datasets"] = \
-          dataset if isinstance(dataset, (list,)) else [dataset]
+    if rerun_failed:
+      plan = [task for task in plan if
+        journal.lookup(task, build) in ["timeout", "error", "skipped"]]
+    else:
+      plan = [task for task in plan if
+        journal.lookup(task, build) not in ["ok", "skipped"]]
+    logging.info('Resume build %d: %d runs to execute.' % (build, len(plan)))
+  journal.start(build)
 
-        if "metric" in values["run"]:
-          logging.info('Script: %s' % (values["script"]))
+  # Reuse the stored results of the runs whose fingerprint didn't change.
+  cache = None
+  reused = []
+  if base_param.get("result_cache", False):
+    cache = ResultCache(base_param.get("result_cache_file",
+      "benchmarks.results"))
+    fingerprint = Fingerprint(base_param.get("library_files"))
+    runs = []
+    for task in plan:
+      try:
+        task["fingerprint"] = fingerprint.run(task)
+      except OSError as e:
+        logging.warning('No fingerprint for %s: %s' % (task["name"], str(e)))
+        runs.append(task)
+        continue
 
-          module = Loader.ImportModuleFromPath(values["script"])
-          method_call = getattr(module, name)
+      stored = cache.lookup(task["fingerprint"])
+      if stored is None:
+        runs.append(task)
+      else:
+        result = dict(stored[1])
+        result["reused_build"] = stored[0]
+        reused.append((task, ("ok", result)))
+    logging.info('Result cache: %d of %d runs unchanged.' % (len(reused),
+      len(plan)))
+    plan = runs
 
-          try:
-            @timeout_decorator.timeout(base_param["timeout"], use_signals=True)
-            def run_timeout_wrapper():
-              instance = method_call(method_param, base_param)
-              logging.info('Run: %s' % (str(instance)))
-
-              # Run the metric method.
-              result = instance.metric()
-              logging.info('Metric: %s' % (str(result)))
-
-              # Pass the result to the driver.
-              if driver:
-                driver.update(values["library"], values["method"],
-                  method_param["datasets"], method_param, base_param, result)
-
-              if len(result.keys()) <= 0:
-                logging.error('No metric results.')
-
-            run_timeout_wrapper()
-          except timeout_decorator.TimeoutError as e:
-            logging.warning('Timeout: %s' % (str(e)))
-          except Exception as e:
-            logging.error('Exception: %s' % (str(e)))
+  prepare_datasets(plan, jobs)
+
+  # Limit the timeouts of the runs with a known runtime.
+  costs = [expected_runtime(task, driver, journal) for task in plan]
+  policy = TimeoutPolicy(base_param)
+  for task, cost in zip(plan, costs):
+    task["timeout"] = policy.timeout(task, cost)
+
+  # Start the runs with the longest expected runtime first.
+  remaining = None
+  if any(cost is not None for cost in costs):
+    plan, costs = order_by_cost(plan, costs)
+    remaining = dict((id(task), cost) for task, cost in zip(plan, costs))
+    logging.info('Expected runtime: %s for %d runs on %d jobs.' % (
+      format_duration(predict_makespan(costs, jobs)), len(plan), jobs))
+
+  # The coordinator hands out the runs to the workers and returns their results
+  # like the local scheduler.
+  if coordinator:
+    scheduler = Coordinator(coordinator, base_param.get("lease", 60),
+      base_param.get("lease_attempts", 3), policy, cluster_token())
+  else:
+    # The datasets of the parallel runs are mapped once and shared by the runs.
+    if jobs > 1:
+      shared.expect(plan)
+    scheduler = Scheduler(jobs, lambda task: execute(task, base_param), policy,
+      shared)
+  report = ScalingReport()
+  try:
+    for task, (status, result) in itertools.chain(reused,
+        scheduler.run(plan)):
+      report.add(task, status, result)
+
+      # Pass the result to the driver.
+      if driver and status == "ok":
+        writer.put(task["library"], task["method"],
+          task["method_param"]["datasets"], task["method_param"], base_param,
+          result)
+
+      if cache and status == "ok" and "fingerprint" in task and \
+          "reused_build" not in result:
+        cache.store(task["fingerprint"], build, result)
+
+      # The result is in the spool of the writer, so the run is done.
+      runtime = None
+      if status == "ok" and isinstance(result.get("runtime"), numbers.Number):
+        runtime = float(result["runtime"])
+      elif status == "timeout":
+        runtime = float(task["timeout"])
+      journal.record(task, build, status, runtime,
+        result if status == "skipped" else None)
+
+      if remaining and id(task) in remaining:
+        del remaining[id(task)]
+        logging.info('Progress: %d runs left, about %s remaining.' % (
+          len(remaining), format_duration(predict_makespan(
+          list(remaining.values()), jobs))))
+
+    # Fit the complexity exponents of the scaling curves.
+    report.save(base_param.get("scaling_file", "benchmarks.scaling"))
+  finally:
+    shutdown_sessions()
+    shared.close()
+    journal.close()
+    if driver:
+      writer.close()
 
 if __name__ == '__main__':
   parser = argparse.ArgumentParser(
     description="""Perform the benchmark with the given config.""")
   parser.add_argument(
-    '-c','--config', help='Configuration file name.', required=True)
+    '-c','--config', help='Configuration file name.', required=False)
   parser.add_argument('-l','--lib',
     help='Run only the specified library scripts.', required=False)
   parser.add_argument('-m','--methods',
@@ -108,8 +476,27 @@ if __name__ == '__main__':
   parser.add_argument('-o','--loglevel',
     help='Loglevel [CRITICAL, ERROR, WARNING, INFO, DEBUG, NONE].',
     required=False)
+  parser.add_argument('-j','--jobs', type=int, default=1,
+    help='Number of benchmark runs to execute in parallel.', required=False)
+  parser.add_argument('--resume', action='store_true',
+    help='Skip the runs that are done in the last build.', required=False)
+  parser.add_argument('--rerun-failed', action='store_true',
+    help='Execute only the runs that failed in the last build.',
+    required=False)
+  parser.add_argument('--coordinator', metavar='HOST:PORT',
+    help='Hand out the runs to the workers that connect to this address '
+    '(the host defaults to 127.0.0.1).',
+    required=False)
+  parser.add_argument('--worker', metavar='HOST:PORT',
+    help='Execute the runs of the coordinator at this address.',
+    required=False)
 
   args = parser.parse_args()
 
-  if args:
-    run(args.config, args.lib, args.methods, args.loglevel)
+  if args.worker:
+    run_worker(args.worker, args.loglevel, args.jobs)
+  elif not args.config:
+    parser.error('the following arguments are required: -c/--config')
+  else:
+    run(args.config, args.lib, args.methods, args.loglevel, args.jobs,
+      args.resume, args.rerun_failed, args.coordinator)
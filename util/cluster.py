@@ -0,0 +1,404 @@
+'''
+  @file cluster.py
+
+  Coordinator and workers to distribute the runs of a benchmark over several
+  machines.
+
+  The coordinator listens on a TCP port and hands out the runs of the plan to
+  the workers that connect to it. The messages are length-prefixed json (see
+  send_message()):
+
+    coordinator -> worker       {"type": "challenge", "nonce": <nonce>}
+    worker      -> coordinator  {"type": "hello", "worker": <name>,
+                                 "nonce": <nonce>, "digest": <digest>}
+    coordinator -> worker       {"type": "welcome", "digest": <digest>}
+    coordinator -> worker       {"type": "run", "id": <id>, "task": <run>,
+                                 "heartbeat": <seconds>}
+    worker      -> coordinator  {"type": "heartbeat", "id": <id>}
+    worker      -> coordinator  {"type": "result", "id": <id>,
+                                 "status": <status>, "result": <result>}
+    coordinator -> worker       {"type": "done"}
+
+  A worker holds a lease on its current run, which it renews with a heartbeat.
+  When the connection of a worker is lost or its lease expires, the run is
+  handed to another worker.
+
+  The coordinator and the workers share a secret token (the
+  BENCHMARK_CLUSTER_TOKEN environment variable). Both sides prove that they
+  know it with the HMAC of the nonce of the other side, so the token itself is
+  never sent. Everyone who knows the token can pass results to the output
+  driver of the coordinator, and a worker executes every run its coordinator
+  sends, i.e. the commands of the method scripts. The connection isn't
+  encrypted either, so the coordinator listens on the loopback interface unless
+  another host is given, and should only be exposed to a trusted network.
+'''
+
+import os
+import hmac
+import time
+import queue
+import socket
+import hashlib
+import logging
+import secrets
+import threading
+import collections
+
+from session import send_message, receive_message
+from scheduler import Scheduler, available_cores
+
+'''
+Split the given 'host:port' address into a (host, port) tuple, the host
+defaults to the loopback interface.
+'''
+def parse_address(address):
+  host, _, port = str(address).rpartition(":")
+  return host or "127.0.0.1", int(port)
+
+'''
+Return the shared secret token of the coordinator and the workers, or None if
+it isn't set.
+'''
+def cluster_token():
+  return os.environ.get("BENCHMARK_CLUSTER_TOKEN") or None
+
+'''
+Return the proof of the given token for the given nonce.
+'''
+def token_digest(token, nonce):
+  return hmac.new(token.encode("utf-8"), str(nonce).encode("utf-8"),
+    hashlib.sha256).hexdigest()
+
+'''
+This class distributes the runs of a plan to the connected workers and returns
+their results, it is used in place of the Scheduler by the coordinator.
+'''
+class Coordinator(object):
+
+  '''
+  Create the coordinator and listen on the given address.
+
+  @param address - The 'host:port' address, e.g. ':7777'.
+  @param lease - The number of seconds without a heartbeat after which the run
+                 of a worker is handed to another worker.
+  @param attempts - The maximum number of workers a run is handed to, before
+                    it is recorded as error.
+  @param policy - The TimeoutPolicy or None.
+  @param token - The shared secret token of the workers; a random token is
+                 generated (and logged) if it's None.
+  '''
+  def __init__(self, address, lease=60, attempts=3, policy=None, token=None):
+    self.lease = max(1.0, float(lease))
+    self.attempts = max(1, int(attempts))
+    self.policy = policy
+    self.token = token
+    if not self.token:
+      self.token = secrets.token_hex(16)
+      logging.info('Coordinator: start the workers with '
+        'BENCHMARK_CLUSTER_TOKEN=%s.' % self.token)
+    self.listener = socket.create_server(parse_address(address))
+    self.condition = threading.Condition()
+
+  '''
+  Execute the given plan on the connected workers.
+
+  @param plan - List of runs, each run is a dict.
+  @return Generator over the (run, result) tuples in the order the runs
+          finish.
+  '''
+  def run(self, plan):
+    self.plan = plan
+    self.pending = collections.deque(range(len(plan)))
+    self.leases = {}
+    self.handed = collections.Counter()
+    self.finished = set()
+    self.results = queue.Queue()
+
+    host, port = self.listener.getsockname()[:2]
+    logging.info('Coordinator: %d runs, waiting for workers on port %d.' % (
+      len(plan), port))
+    threading.Thread(target=self.accept, name="Coordinator",
+      daemon=True).start()
+
+    try:
+      for _ in range(len(plan)):
+        while True:
+          try:
+            index, result = self.results.get(timeout=1)
+            break
+          except queue.Empty:
+            self.expire()
+        yield plan[index], result
+    finally:
+      with self.condition:
+        self.pending.clear()
+        self.finished.update(range(len(plan)))
+        self.condition.notify_all()
+      self.listener.close()
+
+  '''
+  Accept the connections of the workers.
+  '''
+  def accept(self):
+    while True:
+      try:
+        connection, address = self.listener.accept()
+      except OSError:
+        break
+      threading.Thread(target=self.serve, args=(connection, address),
+        daemon=True).start()
+
+  '''
+  Hand out the runs to a single worker until the plan is finished.
+  '''
+  def serve(self, connection, address):
+    name = "%s:%d" % address[:2]
+    try:
+      worker = self.authenticate(connection)
+      if worker is None:
+        logging.warning('Rejected the connection of %s: invalid token.' %
+          name)
+        return
+      name = "%s (%s)" % (worker, name)
+      logging.info('Worker %s connected.' % name)
+
+      while True:
+        index = self.acquire(name)
+        if index is None:
+          send_message(connection, {"type": "done"})
+          break
+
+        send_message(connection, {"type": "run", "id": index,
+          "task": self.plan[index], "heartbeat": self.lease / 3})
+        while True:
+          message = receive_message(connection)
+          if message.get("type") == "heartbeat":
+            self.renew(index, name)
+          elif message.get("type") == "result":
+            self.complete(index, name, (message["status"], message["result"]))
+            break
+    except (OSError, EOFError, ValueError, KeyError) as e:
+      logging.warning('Worker %s disconnected: %s' % (name, str(e)))
+      self.release(name)
+    finally:
+      connection.close()
+
+  '''
+  Check the token of a new worker and prove the token to the worker. A peer
+  that doesn't answer within the lease is dropped.
+
+  @return The name of the worker or None if it doesn't know the token.
+  '''
+  def authenticate(self, connection):
+    nonce = secrets.token_hex(16)
+    connection.settimeout(self.lease)
+    send_message(connection, {"type": "challenge", "nonce": nonce})
+    hello = receive_message(connection)
+    if hello.get("type") != "hello" or not hmac.compare_digest(
+        str(hello.get("digest")), token_digest(self.token, nonce)):
+      return None
+
+    send_message(connection, {"type": "welcome",
+      "digest": token_digest(self.token, hello["nonce"])})
+    connection.settimeout(None)
+    return str(hello.get("worker"))
+
+  '''
+  Wait for the next pending run and lease it to the given worker. The runs
+  skipped by the timeout policy are finished without a worker.
+
+  @return The index of the run or None if the plan is finished.
+  '''
+  def acquire(self, name):
+    with self.condition:
+      while True:
+        while not self.pending:
+          if len(self.finished) == len(self.plan):
+            return None
+          self.condition.wait()
+
+        index = self.pending.popleft()
+        skipped = self.policy.skip(self.plan[index]) if self.policy else None
+        if skipped:
+          self.finished.add(index)
+          self.results.put((index, skipped))
+          self.condition.notify_all()
+          continue
+
+        self.leases[index] = (name, time.time() + self.lease)
+        self.handed[index] += 1
+        return index
+
+  '''
+  Renew the lease of the given worker on the given run.
+  '''
+  def renew(self, index, name):
+    with self.condition:
+      if self.leases.get(index, (None,))[0] == name:
+        self.leases[index] = (name, time.time() + self.lease)
+
+  '''
+  Accept the result of the given run, unless the run was finished by another
+  worker in the meantime.
+  '''
+  def complete(self, index, name, result):
+    with self.condition:
+      if index in self.finished:
+        return
+      if self.leases.get(index, (None,))[0] != name:
+        logging.info('Late result of worker %s accepted.' % name)
+
+      self.finished.add(index)
+      self.leases.pop(index, None)
+      if index in self.pending:
+        self.pending.remove(index)
+      if self.policy:
+        self.policy.update(self.plan[index], result[0])
+      self.results.put((index, result))
+      self.condition.notify_all()
+
+  '''
+  Hand the runs leased to the given worker to another worker.
+  '''
+  def release(self, name):
+    with self.condition:
+      for index, (owner, deadline) in list(self.leases.items()):
+        if owner == name:
+          self.reassign(index)
+
+  '''
+  Hand the runs with an expired lease to another worker.
+  '''
+  def expire(self):
+    now = time.time()
+    with self.condition:
+      for index, (owner, deadline) in list(self.leases.items()):
+        if deadline < now:
+          logging.warning('Lease of worker %s expired.' % owner)
+          self.reassign(index)
+
+  '''
+  Put the given leased run back at the front of the queue, or record it as
+  error if it was handed out too often. The caller holds the condition.
+  '''
+  def reassign(self, index):
+    del self.leases[index]
+    if self.handed[index] >= self.attempts:
+      logging.error('Run %s failed on %d workers.' % (self.plan[index]["name"],
+        self.handed[index]))
+      self.finished.add(index)
+      self.results.put((index, ("error", None)))
+    else:
+      self.pending.appendleft(index)
+    self.condition.notify_all()
+
+'''
+Execute the runs handed out by the coordinator at the given address until the
+plan is finished. Every slot holds its own connection and executes its runs in
+a separate process, pinned to its share of the cores.
+
+@param address - The 'host:port' address of the coordinator.
+@param jobs - The number of runs to execute at the same time.
+@param execute - Function that executes a single run and returns its result.
+@param wait - The number of seconds to wait for the coordinator.
+@param shared - The SharedDatasets of all slots or None.
+@param token - The shared secret token of the coordinator.
+'''
+def work(address, jobs, execute, wait=60, shared=None, token=None):
+  jobs = max(1, int(jobs))
+  cores = available_cores()
+  share = len(cores) // jobs
+
+  slots = []
+  for slot in range(jobs):
+    pinned = cores[slot * share:(slot + 1) * share] if share else []
+    name = "%s-%d-%d" % (socket.gethostname(), os.getpid(), slot)
+    thread = threading.Thread(target=work_slot, args=(address, name,
+      Scheduler(1, execute, shared=shared), pinned, wait, token), name=name)
+    thread.start()
+    slots.append(thread)
+
+  for thread in slots:
+    thread.join()
+
+'''
+Execute the runs of a single worker slot.
+'''
+def work_slot(address, name, scheduler, cores, wait, token):
+  deadline = time.time() + wait
+  while True:
+    try:
+      connection = socket.create_connection(parse_address(address))
+      break
+    except OSError as e:
+      if time.time() > deadline:
+        logging.error('Worker %s: %s' % (name, str(e)))
+        return
+      time.sleep(1)
+
+  # The heartbeats are sent while the run is executed, the lock serializes the
+  # messages of both threads.
+  lock = threading.Lock()
+  try:
+    if not introduce(connection, name, token):
+      logging.error('Worker %s: the coordinator rejected the token or '
+        'doesn\'t know it.' % name)
+      return
+
+    while True:
+      message = receive_message(connection)
+      if message.get("type") != "run":
+        break
+
+      logging.info('Worker %s: %s' % (name, message["task"]["name"]))
+      stop = threading.Event()
+      heartbeat = threading.Thread(target=send_heartbeats, args=(connection,
+        lock, message["id"], message["heartbeat"], stop), daemon=True)
+      heartbeat.start()
+      try:
+        status, result = scheduler.execute_isolated(message["task"], cores)
+      finally:
+        stop.set()
+        heartbeat.join()
+
+      with lock:
+        send_message(connection, {"type": "result", "id": message["id"],
+          "status": status, "result": result})
+  except (EOFError, ConnectionError):
+    # The coordinator exits once the plan is finished.
+    logging.info('Worker %s: the coordinator closed the connection.' % name)
+  except (OSError, ValueError) as e:
+    logging.error('Worker %s: lost the coordinator: %s' % (name, str(e)))
+  finally:
+    connection.close()
+
+'''
+Answer the challenge of the coordinator with the proof of the token and check
+the proof of the coordinator, so the worker never executes the runs of a
+coordinator that doesn't know the token.
+
+@return True if both sides know the token.
+'''
+def introduce(connection, name, token):
+  try:
+    challenge = receive_message(connection)
+    nonce = secrets.token_hex(16)
+    send_message(connection, {"type": "hello", "worker": name, "nonce": nonce,
+      "digest": token_digest(token, challenge.get("nonce"))})
+    welcome = receive_message(connection)
+  except EOFError:
+    return False
+
+  return welcome.get("type") == "welcome" and hmac.compare_digest(
+    str(welcome.get("digest")), token_digest(token, nonce))
+
+'''
+Send a heartbeat for the given run every interval seconds until stop is set.
+'''
+def send_heartbeats(connection, lock, index, interval, stop):
+  while not stop.wait(interval):
+    try:
+      with lock:
+        send_message(connection, {"type": "heartbeat", "id": index})
+    except OSError:
+      break
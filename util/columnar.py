@@ -0,0 +1,215 @@
+'''
+  @file columnar.py
+
+  Columnar driver.
+'''
+
+import os
+import re
+import json
+import logging
+
+import numpy as np
+
+from util import atomic_save
+from database import flatten_metrics
+
+try:
+  import pyarrow
+  import pyarrow.parquet as parquet
+except ImportError:
+  parquet = None
+
+'''
+The file name pattern of the parts of a build.
+'''
+PART_PATTERN = re.compile(r"^build-(\d+)(?:-part-(\d+))?\.(parquet|npy)$")
+
+'''
+Columnar driver class to write the output into a directory of Parquet files,
+or NumPy structured arrays if pyarrow isn't available. Every row holds the
+build, the library, the method, the datasets and parameters (json), the runtime
+and one column per numeric metric (nested metrics like the trial summary are
+flattened into dotted names). Every flush() appends a new part file to the
+build, the result writer flushes the driver every 'columnar_batch_size' results
+or 'columnar_flush_interval' seconds; close() merges the parts into a single
+file per build. Use load() to read the directory into a pandas DataFrame.
+'''
+class Driver(object):
+  def __init__(self, param):
+    self.build = 1
+    self.path = param["columnar_path"]
+    self.format = param.get("columnar_format",
+      "parquet" if parquet else "npy")
+    if self.format not in ["parquet", "npy"]:
+      raise Exception("unknown columnar_format: " + str(self.format))
+    if self.format == "parquet" and parquet is None:
+      logging.warning('Columnar driver: pyarrow is not installed, writing '
+        'NumPy structured arrays instead of Parquet files.')
+      self.format = "npy"
+    self.batch_size = max(1, int(param.get("columnar_batch_size", 64)))
+    self.flush_interval = float(param.get("columnar_flush_interval", 30))
+    self.rows = []
+    self.parts = 0
+
+    os.makedirs(self.path, exist_ok=True)
+    self.latest_build()
+
+  def latest_build(self):
+    builds = [int(match.group(1)) for match in map(PART_PATTERN.match,
+      os.listdir(self.path)) if match]
+    if builds:
+      self.build = max(builds) + 1
+
+  def update(self, library, method, datasets, method_param, base_param, result):
+    runtime = 0
+    if "runtime" in result:
+      runtime = result["runtime"]
+
+    row = {"build": self.build, "library": str(library),
+      "method": str(method), "datasets": json.dumps(datasets, default=str),
+      "method_param": json.dumps(method_param, sort_keys=True, default=str),
+      "base_param": json.dumps(base_param, sort_keys=True, default=str),
+      "runtime": float(runtime), "result": json.dumps(result, default=str)}
+    for name, value, text in flatten_metrics(result):
+      if value is not None and name not in row:
+        row[name] = value
+    self.rows.append(row)
+
+  '''
+  Write the buffered rows into a new part file of the build.
+  '''
+  def flush(self):
+    if not self.rows:
+      return
+
+    self.parts += 1
+    self.write(os.path.join(self.path, "build-%06d-part-%06d.%s" % (
+      self.build, self.parts, self.format)), to_columns(self.rows))
+    self.rows = []
+
+  '''
+  Write the buffered rows and merge the part files of the build.
+  '''
+  def close(self):
+    self.flush()
+    if self.parts == 0:
+      return
+
+    parts = sorted(os.path.join(self.path, name) for name in
+      os.listdir(self.path) if is_part(name, self.build))
+    rows = []
+    for part in parts:
+      rows.extend(to_rows(read(part)))
+
+    self.write(os.path.join(self.path, "build-%06d.%s" % (self.build,
+      self.format)), to_columns(rows))
+    for part in parts:
+      os.remove(part)
+    self.parts = 0
+
+  '''
+  Write the given columns atomically into the given file.
+  '''
+  def write(self, path, columns):
+    if self.format == "parquet":
+      table = pyarrow.table(columns)
+      atomic_save(path, lambda fid: parquet.write_table(table, fid))
+    else:
+      array = to_structured(columns)
+      atomic_save(path, lambda fid: np.save(fid, array, allow_pickle=False))
+
+'''
+Return True if the given file name is a part file of the given build.
+'''
+def is_part(name, build):
+  match = PART_PATTERN.match(name)
+  return bool(match and match.group(2) and int(match.group(1)) == build)
+
+'''
+Convert the given rows (dicts) into columns, missing numeric values are nan.
+'''
+def to_columns(rows):
+  names = []
+  for row in rows:
+    names.extend(name for name in row if name not in names)
+
+  columns = {}
+  for name in names:
+    values = [row.get(name) for row in rows]
+    if all(isinstance(value, str) or value is None for value in values):
+      columns[name] = ["" if value is None else value for value in values]
+    else:
+      columns[name] = np.array([np.nan if value is None else value
+        for value in values], dtype=np.float64)
+  columns["build"] = np.array([row["build"] for row in rows], dtype=np.int64)
+  return columns
+
+'''
+Convert the given columns into a list of rows (dicts).
+'''
+def to_rows(columns):
+  names = list(columns)
+  values = [list(columns[name]) for name in names]
+  return [dict(zip(names, row)) for row in zip(*values)]
+
+'''
+Convert the given columns into a NumPy structured array.
+'''
+def to_structured(columns):
+  dtype = []
+  for name, values in columns.items():
+    if isinstance(values, np.ndarray):
+      dtype.append((name, values.dtype))
+    else:
+      dtype.append((name, "U%d" % max([1] + [len(value) for value in values])))
+
+  array = np.empty(len(columns["build"]), dtype=dtype)
+  for name, values in columns.items():
+    array[name] = values
+  return array
+
+'''
+Read the columns of the given part file.
+'''
+def read(path):
+  if path.endswith(".parquet"):
+    if parquet is None:
+      raise Exception("reading " + path + " requires pyarrow.")
+    table = parquet.read_table(path)
+    return {name: table.column(name).to_pylist() for name in
+      table.column_names}
+
+  array = np.load(path, allow_pickle=False)
+  return {name: [value.item() for value in array[name]] for name in
+    array.dtype.names}
+
+'''
+Load the results in the given directory into a pandas DataFrame.
+
+@param path - The directory of the columnar driver.
+@return The DataFrame with one row per result.
+'''
+def load(path):
+  try:
+    import pandas
+  except ImportError:
+    raise Exception("load() requires pandas, use read() for single files.")
+
+  files = sorted(name for name in os.listdir(path) if
+    PART_PATTERN.match(name))
+  frames = []
+  for name in files:
+    if name.endswith(".parquet"):
+      try:
+        frames.append(pandas.read_parquet(os.path.join(path, name)))
+      except ImportError:
+        raise Exception("reading " + name + " requires the parquet support "
+          "of pandas (pyarrow or fastparquet).")
+    else:
+      frames.append(pandas.DataFrame(np.load(os.path.join(path, name),
+        allow_pickle=False)))
+
+  if not frames:
+    return pandas.DataFrame()
+  return pandas.concat(frames, ignore_index=True, sort=False)
@@ -0,0 +1,388 @@
+'''
+  @file database.py
+
+  Normalized results schema shared by the database drivers.
+
+  The results are stored in the following tables:
+
+    builds     - One row per benchmark invocation with the run parameters.
+    libraries  - The names of the benchmarked libraries.
+    methods    - The names of the benchmarked methods.
+    datasets   - The dataset lists of the runs (json).
+    parameters - The method parameter sets of the runs (json).
+    runs       - One row per run, referencing the rows above, with the runtime.
+    metrics    - One typed row per metric value of a run.
+
+  The names in the lookup tables are identified by their sha1 hash, so that
+  long names can be indexed by every database. The runs are indexed by
+  (method, library, dataset, build), so the history of a single benchmark is
+  read from the index instead of a table scan.
+'''
+
+import ast
+import json
+import time
+import logging
+import numbers
+import hashlib
+
+'''
+The lookup tables, which map a name to an id.
+'''
+LOOKUP_TABLES = ["libraries", "methods", "datasets", "parameters"]
+
+'''
+Return the canonical json representation of the given value.
+'''
+def canonical(value):
+  return json.dumps(value, sort_keys=True, default=str)
+
+'''
+Flatten the given result into a list of (name, value, text) metric rows:
+numbers are stored as value, everything else as json text. Nested dicts (e.g.
+the trial summary) are flattened into dotted names like 'trials.runtime.mean'.
+'''
+def flatten_metrics(result, prefix=""):
+  rows = []
+  for key in sorted(result, key=str):
+    name = prefix + str(key)
+    value = result[key]
+    if isinstance(value, dict):
+      rows.extend(flatten_metrics(value, name + "."))
+    elif isinstance(value, numbers.Number) and not isinstance(value, complex):
+      rows.append((name, float(value), None))
+    else:
+      rows.append((name, None, canonical(value)))
+  return rows
+
+'''
+Rewrite the reprs of special floats (nan, inf) and numpy scalars (e.g.
+np.float64(1.5)) in the given expression into plain constants.
+'''
+class LiteralTransformer(ast.NodeTransformer):
+  def visit_Name(self, node):
+    if node.id in ["nan", "inf"]:
+      return ast.Constant(float(node.id))
+    return node
+
+  def visit_Call(self, node):
+    self.generic_visit(node)
+    if len(node.args) == 1 and not node.keywords:
+      return node.args[0]
+    return node
+
+'''
+Parse a python literal written by the legacy drivers with str(). Return the
+given text if it can't be parsed.
+'''
+def parse_literal(text):
+  try:
+    tree = ast.parse(text.strip(), mode="eval")
+    return ast.literal_eval(LiteralTransformer().visit(tree).body)
+  except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+    return text
+
+'''
+Base class of the database drivers, which implements the normalized schema on
+top of a DB-API connection. The subclasses provide the connection and the
+dialect specific parts.
+'''
+class Database(object):
+
+  '''
+  The parameter placeholder of the DB-API module.
+  '''
+  placeholder = "?"
+
+  '''
+  The column definition of an auto increment primary key.
+  '''
+  primary_key = "INTEGER PRIMARY KEY AUTOINCREMENT"
+
+  '''
+  The exceptions of the DB-API module after which a transaction is retried on a
+  new connection, e.g. a lost connection or a locked database.
+  '''
+  transient_errors = ()
+
+  '''
+  The number of retries of a failed transaction and the delay before the first
+  retry in seconds, which is doubled for every further retry.
+  '''
+  retries = 5
+  retry_delay = 0.5
+
+  '''
+  Set the retry options from the given driver parameters.
+  '''
+  def configure_retries(self, param):
+    self.retries = int(param.get("retries", self.retries))
+    self.retry_delay = float(param.get("retry_delay", self.retry_delay))
+
+  '''
+  Create the tables and indexes and migrate the results of the legacy
+  'results' table.
+  '''
+  def create_tables(self):
+    self.ids = {}
+
+    for table in LOOKUP_TABLES:
+      self.execute("""
+          CREATE TABLE IF NOT EXISTS %s (
+            id %s,
+            hash CHAR(40) NOT NULL UNIQUE,
+            name TEXT NOT NULL
+          )""" % (table, self.primary_key))
+
+    self.execute("""
+        CREATE TABLE IF NOT EXISTS builds (
+          id INTEGER PRIMARY KEY,
+          time REAL NOT NULL,
+          base_param TEXT NOT NULL
+        )""")
+
+    self.execute("""
+        CREATE TABLE IF NOT EXISTS runs (
+          id %s,
+          build INTEGER NOT NULL REFERENCES builds(id),
+          library INTEGER NOT NULL REFERENCES libraries(id),
+          method INTEGER NOT NULL REFERENCES methods(id),
+          dataset INTEGER NOT NULL REFERENCES datasets(id),
+          parameter INTEGER NOT NULL REFERENCES parameters(id),
+          runtime REAL NOT NULL
+        )""" % self.primary_key)
+
+    self.execute("""
+        CREATE TABLE IF NOT EXISTS metrics (
+          run INTEGER NOT NULL REFERENCES runs(id),
+          name VARCHAR(255) NOT NULL,
+          value REAL,
+          text TEXT,
+          PRIMARY KEY (run, name)
+        )""")
+
+    self.create_index("runs_benchmark", "runs",
+      ["method", "library", "dataset", "build"])
+    self.create_index("runs_build", "runs", ["build"])
+    self.connection.commit()
+
+    if self.has_table("results"):
+      self.migrate()
+
+  '''
+  Copy the rows of the legacy 'results' table, which stored the parameters and
+  results as str() of python dicts, into the normalized tables and remove the
+  legacy table.
+  '''
+  def migrate(self):
+    self.execute("SELECT build, library, datasets, method, method_param, "
+      "base_param, result FROM results ORDER BY id")
+    rows = self.cursor.fetchall()
+
+    try:
+      for build, library, datasets, method, method_param, base_param, \
+          result in rows:
+        result = parse_literal(result)
+        if not isinstance(result, dict):
+          result = {"result": result}
+
+        self.insert_run(int(build), library, parse_literal(datasets), method,
+          parse_literal(method_param), parse_literal(base_param), result)
+
+      self.execute("DROP TABLE results")
+      self.connection.commit()
+    except Exception:
+      self.connection.rollback()
+      self.ids = {}
+      raise
+
+  '''
+  Return the number of the latest build.
+  '''
+  def last_build(self):
+    self.execute("SELECT MAX(id) FROM builds")
+    result = self.cursor.fetchone()
+    if result and result[0] is not None:
+      return int(result[0])
+    return 0
+
+  '''
+  Execute the given statement, with '?' as parameter placeholder.
+  '''
+  def execute(self, command, args=()):
+    self.cursor.execute(command.replace("?", self.placeholder), args)
+
+  '''
+  Return the id of the given name in the given lookup table, insert the name
+  if it isn't in the table.
+  '''
+  def lookup(self, table, name):
+    key = hashlib.sha1(name.encode("utf-8")).hexdigest()
+    if (table, key) in self.ids:
+      return self.ids[(table, key)]
+
+    self.execute("SELECT id FROM %s WHERE hash = ?" % table, (key,))
+    result = self.cursor.fetchone()
+    if result:
+      index = int(result[0])
+    else:
+      self.execute("INSERT INTO %s (hash, name) VALUES (?, ?)" % table,
+        (key, name))
+      index = int(self.cursor.lastrowid)
+
+    self.ids[(table, key)] = index
+    return index
+
+  '''
+  Insert a single run, without committing the transaction.
+  '''
+  def insert_run(self, build, library, datasets, method, method_param,
+      base_param, result):
+    if ("builds", build) not in self.ids:
+      self.execute("SELECT id FROM builds WHERE id = ?", (build,))
+      if not self.cursor.fetchone():
+        self.execute("INSERT INTO builds (id, time, base_param) VALUES "
+          "(?, ?, ?)", (build, time.time(), canonical(base_param)))
+      self.ids[("builds", build)] = build
+
+    # The datasets are stored in their own table.
+    if isinstance(method_param, dict):
+      method_param = dict(method_param)
+      method_param.pop("datasets", None)
+
+    runtime = 0
+    if "runtime" in result:
+      runtime = result["runtime"]
+
+    self.execute("INSERT INTO runs (build, library, method, dataset, "
+      "parameter, runtime) VALUES (?, ?, ?, ?, ?, ?)", (build,
+      self.lookup("libraries", str(library)),
+      self.lookup("methods", str(method)),
+      self.lookup("datasets", canonical(datasets)),
+      self.lookup("parameters", canonical(method_param)),
+      float(runtime) if isinstance(runtime, numbers.Number) else 0))
+    run = int(self.cursor.lastrowid)
+
+    for name, value, text in flatten_metrics(result):
+      self.execute("INSERT INTO metrics (run, name, value, text) VALUES "
+        "(?, ?, ?, ?)", (run, name, value, text))
+
+  '''
+  Insert the given runs in a single transaction.
+
+  @param rows - List of (build, library, datasets, method, method_param,
+                base_param, result) tuples.
+  '''
+  def insert_runs(self, rows):
+    delay = self.retry_delay
+    for attempt in range(self.retries + 1):
+      try:
+        for row in rows:
+          self.insert_run(*row)
+        self.connection.commit()
+        return
+      except self.transient_errors as e:
+        self.rollback()
+        if attempt == self.retries:
+          raise
+
+        logging.warning('Database error: %s, retry in %.1f seconds.' % (
+          str(e), delay))
+        time.sleep(delay)
+        delay *= 2
+
+        try:
+          self.connection.close()
+        except Exception:
+          pass
+        self.connect()
+      except Exception:
+        self.rollback()
+        raise
+
+  '''
+  Roll back the current transaction.
+  '''
+  def rollback(self):
+    try:
+      self.connection.rollback()
+    except Exception:
+      pass
+
+    # The cached ids of the rolled back rows are invalid.
+    self.ids = {}
+
+  '''
+  Return the id of the given name in the given lookup table or None.
+  '''
+  def find(self, table, name):
+    key = hashlib.sha1(name.encode("utf-8")).hexdigest()
+    self.execute("SELECT id FROM %s WHERE hash = ?" % table, (key,))
+    result = self.cursor.fetchone()
+    return int(result[0]) if result else None
+
+  '''
+  Return the history of a single benchmark.
+
+  @param library - The name of the library, e.g. 'mlpack'.
+  @param method - The name of the method, e.g. 'KMEANS'.
+  @param datasets - The list of datasets of the run.
+  @param method_param - The method parameters of the run (without the
+                        datasets). Default the runs of all parameter sets.
+  @param metric - The name of the metric, e.g. 'runtime' or 'trials.runtime.iqr'.
+  @return List of (build, value) tuples ordered by build.
+  '''
+  def time_series(self, library, method, datasets, method_param=None,
+      metric="runtime"):
+    ids = [self.find("methods", str(method)),
+      self.find("libraries", str(library)),
+      self.find("datasets", canonical(datasets))]
+    if method_param is not None:
+      method_param = dict(method_param)
+      method_param.pop("datasets", None)
+      ids.append(self.find("parameters", canonical(method_param)))
+    if None in ids:
+      return []
+
+    condition = "r.method = ? AND r.library = ? AND r.dataset = ?"
+    if method_param is not None:
+      condition += " AND r.parameter = ?"
+
+    if metric == "runtime":
+      self.execute("SELECT r.build, r.runtime FROM runs r WHERE " + condition +
+        " ORDER BY r.build, r.id", ids)
+    else:
+      self.execute("SELECT r.build, m.value FROM runs r JOIN metrics m ON "
+        "m.run = r.id AND m.name = ? WHERE " + condition +
+        " ORDER BY r.build, r.id", [metric] + ids)
+
+    return [(int(build), value) for build, value in self.cursor.fetchall()]
+
+  '''
+  Return all runs of the given build.
+
+  @param build - The build number, default the latest build.
+  @return List of dicts with the library, method, datasets, method_param,
+          runtime and the metrics of every run.
+  '''
+  def build_results(self, build=None):
+    if build is None:
+      build = self.last_build()
+
+    self.execute("SELECT r.id, l.name, m.name, d.name, p.name, r.runtime "
+      "FROM runs r JOIN libraries l ON l.id = r.library "
+      "JOIN methods m ON m.id = r.method JOIN datasets d ON d.id = r.dataset "
+      "JOIN parameters p ON p.id = r.parameter WHERE r.build = ? "
+      "ORDER BY r.id", (build,))
+    runs = [{"id": run, "library": library, "method": method,
+      "datasets": json.loads(datasets), "method_param": json.loads(param),
+      "runtime": runtime, "metrics": {}} for run, library, method, datasets,
+      param, runtime in self.cursor.fetchall()]
+
+    for run in runs:
+      self.execute("SELECT name, value, text FROM metrics WHERE run = ?",
+        (run["id"],))
+      for name, value, text in self.cursor.fetchall():
+        run["metrics"][name] = value if text is None else json.loads(text)
+
+    return runs
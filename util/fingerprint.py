@@ -0,0 +1,170 @@
+'''
+  @file fingerprint.py
+
+  Content-addressed cache of benchmark results.
+'''
+
+import os
+import glob
+import json
+import hashlib
+
+from util import file_checksum, dataset_cache_path, binary_dataset
+from synthetic import is_synthetic, parse_spec, spec_key
+
+try:
+  import importlib.metadata as metadata
+except ImportError:
+  metadata = None
+
+'''
+This class computes the fingerprint of a benchmark run from everything that
+determines its result: the wrapper script (and the scripts next to it with the
+same name, e.g. methods/R/nbc.r or methods/matlab/NBC.m), the files and python
+packages of the library, the content of the datasets and the parameters. The
+checksums are computed once per benchmark invocation.
+
+The library files are given by the 'library_files' option, a dict from the
+library name to a list of glob patterns; 'python:<package>' entries stand for
+the version of the installed python package.
+'''
+class Fingerprint(object):
+
+  def __init__(self, library_files):
+    self.library_files = library_files or {}
+    self.checksums = {}
+
+  '''
+  Return the fingerprint of the given run of the plan.
+  '''
+  def run(self, task):
+    param = dict(task["method_param"])
+    datasets = param.pop("datasets", [])
+
+    return hashlib.sha256(json.dumps({
+      "block": task["name"], "method": task["method"],
+      "script": self.script(task["script"]),
+      "library": self.library(task["library"]),
+      "version": task.get("version", ""),
+      "datasets": [self.dataset(dataset) for dataset in datasets],
+      "param": param, "trial_param": task.get("trial_param"),
+      "cores": task.get("cores")}, sort_keys=True,
+      default=str).encode("utf-8")).hexdigest()
+
+  '''
+  Return the checksum of the given file, computed once per invocation.
+  '''
+  def file(self, path):
+    path = os.path.abspath(path)
+    if path not in self.checksums:
+      self.checksums[path] = file_checksum(path)
+    return self.checksums[path]
+
+  '''
+  Return the checksums of the given wrapper script and of the other scripts
+  with the same name in its directory.
+  '''
+  def script(self, script):
+    directory = os.path.dirname(script) or "."
+    stem = os.path.splitext(os.path.basename(script))[0].lower()
+    return {name: self.file(os.path.join(directory, name)) for name in
+      sorted(os.listdir(directory)) if
+      os.path.splitext(name)[0].lower() == stem and
+      os.path.isfile(os.path.join(directory, name))}
+
+  '''
+  Return the checksums of the files and the versions of the python packages of
+  the given library.
+  '''
+  def library(self, library):
+    result = {}
+    for pattern in self.library_files.get(library, []):
+      if pattern.startswith("python:"):
+        if pattern not in self.checksums:
+          self.checksums[pattern] = package_version(pattern[len("python:"):])
+        result[pattern] = self.checksums[pattern]
+      else:
+        for path in sorted(glob.glob(pattern)):
+          if os.path.isfile(path):
+            result[path] = self.file(path)
+    return result
+
+  '''
+  Return the checksum of the given dataset. The checksum recorded by the
+  dataset cache (see load_csv()) is used if the file is unchanged since. A
+  synthetic dataset is identified by its generator, parameters and part.
+  '''
+  def dataset(self, path):
+    if is_synthetic(path):
+      generator, param, part = parse_spec(path)
+      return "%s/%s" % (spec_key(generator, param), part)
+
+    binary = binary_dataset(path)
+    if binary:
+      return self.file(binary)
+
+    stat = os.stat(path)
+    index = os.path.join(dataset_cache_path(path), os.path.basename(path) +
+      ".json")
+    try:
+      with open(index, "r") as fid:
+        entry = json.load(fid)
+      if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+        return entry["checksum"]
+    except (OSError, ValueError, KeyError):
+      pass
+
+    return self.file(path)
+
+'''
+Return the version of the given installed python package or None.
+'''
+def package_version(package):
+  if metadata is not None:
+    try:
+      return metadata.version(package)
+    except metadata.PackageNotFoundError:
+      pass
+
+  try:
+    module = __import__(package)
+    return str(getattr(module, "__version__", "unknown"))
+  except Exception:
+    return None
+
+'''
+This class stores the results of the benchmark runs by their fingerprint in
+an append-only json lines file.
+'''
+class ResultCache(object):
+
+  def __init__(self, path):
+    self.path = path
+    self.results = {}
+
+    if os.path.isfile(path):
+      with open(path, "r") as fid:
+        for line in fid:
+          try:
+            entry = json.loads(line)
+            self.results[entry["fingerprint"]] = entry
+          except (ValueError, KeyError):
+            continue
+
+  '''
+  Return the stored (build, result) of the given fingerprint or None.
+  '''
+  def lookup(self, fingerprint):
+    entry = self.results.get(fingerprint)
+    if entry is None:
+      return None
+    return entry["build"], entry["result"]
+
+  '''
+  Store the result of the given fingerprint.
+  '''
+  def store(self, fingerprint, build, result):
+    entry = {"fingerprint": fingerprint, "build": build, "result": result}
+    self.results[fingerprint] = entry
+    with open(self.path, "a") as fid:
+      fid.write(json.dumps(entry, default=str) + "\n")
@@ -0,0 +1,119 @@
+'''
+  @file journal.py
+
+  Persistent execution journal to resume interrupted benchmarks.
+'''
+
+import os
+import json
+import time
+import hashlib
+
+'''
+This class records the status of every finished benchmark run in an append-only
+file. A run is identified by its block name, its parameter set, its datasets,
+the version of the library and the build of the benchmark invocation, so a
+resumed invocation (which continues the build of the interrupted one) can skip
+the runs that are already done. The runtime of every run is recorded as well,
+so the runs of the next invocation can be scheduled by their expected runtime.
+'''
+class Journal(object):
+
+  '''
+  Open the journal and read the recorded runs.
+
+  @param path - The path of the journal file.
+  '''
+  def __init__(self, path):
+    self.path = path
+    self.status = {}
+    self.builds = []
+    self.runtimes = {}
+
+    if os.path.isfile(path):
+      with open(path, "r") as fid:
+        for line in fid:
+          try:
+            entry = json.loads(line)
+          except ValueError:
+            # The last line of an interrupted invocation may be incomplete.
+            continue
+
+          if "key" in entry:
+            self.status[entry["key"]] = entry["status"]
+            if entry.get("runtime") is not None:
+              self.runtimes[entry["run"]] = entry["runtime"]
+          elif "build" in entry:
+            self.builds.append(entry["build"])
+
+    self.stream = open(path, "a")
+    # Terminate an incomplete last line, so it doesn't swallow the next entry.
+    if self.stream.tell() > 0:
+      with open(path, "rb") as fid:
+        fid.seek(-1, os.SEEK_END)
+        if fid.read(1) != b"\n":
+          self.stream.write("\n")
+
+  '''
+  Return the key of the given run of the plan in the given build, or of the run
+  independent of the build if build is None.
+  '''
+  def key(self, task, build=None):
+    param = dict(task["method_param"])
+    datasets = param.pop("datasets", [])
+    identity = [task["name"], param, datasets, task.get("version", "")]
+    if build is not None:
+      identity.append(build)
+    return hashlib.sha1(json.dumps(identity, sort_keys=True,
+      default=str).encode("utf-8")).hexdigest()
+
+  '''
+  Return the build of the last recorded benchmark invocation or None.
+  '''
+  def last_build(self):
+    return self.builds[-1] if self.builds else None
+
+  '''
+  Return the recorded status ('ok', 'timeout', 'error' or 'skipped') of the
+  given run or None if the run wasn't finished.
+  '''
+  def lookup(self, task, build):
+    return self.status.get(self.key(task, build))
+
+  '''
+  Return the last recorded runtime of the given run in any build or None.
+  '''
+  def runtime(self, task):
+    return self.runtimes.get(self.key(task))
+
+  '''
+  Record the start of a benchmark invocation with the given build.
+  '''
+  def start(self, build):
+    self.builds.append(build)
+    self.write({"build": build, "time": time.time()})
+
+  '''
+  Record the status, the runtime (if known) and the details (e.g. the reason
+  of a skipped run) of the given finished run.
+  '''
+  def record(self, task, build, status, runtime=None, detail=None):
+    key = self.key(task, build)
+    self.status[key] = status
+    if runtime is not None:
+      self.runtimes[self.key(task)] = runtime
+    self.write({"key": key, "run": self.key(task), "status": status,
+      "runtime": runtime, "block": task["name"],
+      "datasets": task["method_param"].get("datasets"), "detail": detail,
+      "time": time.time()})
+
+  '''
+  Append the given entry to the journal file.
+  '''
+  def write(self, entry):
+    self.stream.write(json.dumps(entry, default=str) + "\n")
+    self.stream.flush()
+    os.fsync(self.stream.fileno())
+
+  def close(self):
+    self.stream.close()
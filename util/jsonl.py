@@ -0,0 +1,72 @@
+'''
+  @file jsonl.py
+
+  JSON Lines driver.
+'''
+
+import os
+import json
+
+from util import last_line
+
+'''
+JSON Lines driver class to write the output to a text file with one json
+document per result, which can be loaded with pandas.read_json(file,
+lines=True).
+'''
+class Driver(object):
+  def __init__(self, param):
+    self.build = 1
+    self.file = param["jsonl_file"]
+    self.stream = None
+
+    self.latest_build()
+
+  def latest_build(self):
+    line = last_line(self.file)
+    if line:
+      self.build = int(json.loads(line)["build"]) + 1
+
+  def update(self, library, method, datasets, method_param, base_param, result):
+    if self.stream is None:
+      self.open()
+
+    runtime = 0
+    if "runtime" in result:
+      runtime = result["runtime"]
+
+    self.stream.write(json.dumps({"build": self.build, "library": library,
+      "method": method, "datasets": datasets, "method_param": method_param,
+      "base_param": base_param, "runtime": runtime, "result": result},
+      default=str) + "\n")
+
+  '''
+  Open the file for appending. An incomplete last line of an interrupted write
+  is removed, so it doesn't corrupt the next document.
+  '''
+  def open(self):
+    if os.path.isfile(self.file):
+      with open(self.file, "rb+") as fid:
+        position = fid.seek(0, os.SEEK_END)
+        while position > 0:
+          fid.seek(max(0, position - 65536))
+          data = fid.read(position - max(0, position - 65536))
+          end = data.rfind(b"\n")
+          if end >= 0:
+            position = position - len(data) + end + 1
+            break
+          position -= len(data)
+        fid.truncate(position)
+
+    self.stream = open(self.file, "a")
+
+  def flush(self):
+    if self.stream is not None:
+      self.stream.flush()
+      os.fsync(self.stream.fileno())
+
+  def close(self):
+    if self.stream is not None:
+      self.flush()
+      self.stream.close()
+      self.stream = None
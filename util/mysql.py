@@ -7,10 +7,18 @@
 
 import MySQLdb as mdb
 
+from database import Database
+
 '''
-MySQL driver class to write the into a MySQL database.
+MySQL driver class to write the into a MySQL database, using the normalized
+schema of database.py.
 '''
-class Driver(object):
+class Driver(Database):
+
+  placeholder = "%s"
+  primary_key = "INTEGER PRIMARY KEY AUTO_INCREMENT"
+  transient_errors = (mdb.OperationalError, mdb.InterfaceError)
+
   def __init__(self, param):
     self.build = 1
     self.connection = None
@@ -21,52 +29,53 @@ class Driver(object):
     self.user = param["mysql_user"]
     self.database = param["mysql_database"]
     self.password = param["mysql_password"]
+    self.configure_retries(param)
 
     self.connect()
-    self.create_table()
+    self.create_tables()
     self.latest_build()
 
   def connect(self):
     self.connection = mdb.connect(host=self.host, port=self.port,
       user=self.user, db=self.database, passwd=self.password)
     self.cursor = self.connection.cursor()
-    self.cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
 
-  def create_table(self):
-    comand = """
-        CREATE TABLE IF NOT EXISTS results (
-          id INTEGER PRIMARY KEY %s,
-          build INTEGER NOT NULL,
-          library TEXT NOT NULL,
-          datasets TEXT NOT NULL,
-          method TEXT NOT NULL,
-          method_param TEXT NOT NULL,
-          base_param TEXT NOT NULL,
-          runtime REAL NOT NULL,
-          result TEXT NOT NULL
-        );
-        """
-    self.cursor.execute(comand % "AUTOINCREMENT")
+  '''
+  Return True if the given table exists.
+  '''
+  def has_table(self, table):
+    self.execute("SELECT COUNT(*) FROM information_schema.tables WHERE "
+      "table_schema = DATABASE() AND table_name = ?", (table,))
+    return self.cursor.fetchone()[0] > 0
 
-  def latest_build(self):
-    with self.connection:
-      command = "SELECT build FROM results ORDER BY build DESC"
-      self.cursor.execute(command)
-      result = self.cursor.fetchall()
+  '''
+  Create the given index, MySQL doesn't support CREATE INDEX IF NOT EXISTS.
+  '''
+  def create_index(self, name, table, columns):
+    self.execute("SELECT COUNT(*) FROM information_schema.statistics WHERE "
+      "table_schema = DATABASE() AND table_name = ? AND index_name = ?",
+      (table, name))
+    if self.cursor.fetchone()[0] == 0:
+      self.execute("CREATE INDEX %s ON %s (%s)" % (name, table,
+        ", ".join(columns)))
 
-      if result:
-        self.build = int(result[0][0]) + 1
+  def latest_build(self):
+    self.build = self.last_build() + 1
 
   def update(self, library, method, datasets, method_param, base_param, result):
-    self.connect()
-    with self.connection:
-      command = "INSERT INTO results VALUES (NULL,%s,%s,%s,%s,%s,%s,%s,%s)"
+    self.insert_runs([(self.build, library, datasets, method, method_param,
+      base_param, result)])
 
-      runtime = 0
-      if "runtime" in result:
-        runtime = result["runtime"]
+  '''
+  The results are committed by update(), there is nothing to flush.
+  '''
+  def flush(self):
+    pass
 
-      self.cursor.execute(command % ('?', '?', '?', '?', '?', '?', '?', '?'),
-        (self.build, str(library), str(datasets), str(method),
-        str(method_param), str(base_param), runtime, str(result)))
-      self.cursor.execute("SELECT LAST_INSERT_ID()")
+  '''
+  Close the connection.
+  '''
+  def close(self):
+    if self.connection is not None:
+      self.connection.close()
+      self.connection = None
@@ -0,0 +1,233 @@
+'''
+  @file scaling.py
+
+  Scaling curves: runs of a block on geometrically spaced subsamples of its
+  datasets and the empirical complexity exponents of the runtime.
+'''
+
+import os
+import json
+import logging
+import collections
+
+import numpy as np
+
+from util import load_csv, file_checksum, atomic_save, binary_dataset
+from synthetic import resolve_datasets
+
+'''
+Return the geometrically spaced sizes total, total / factor, total / factor^2,
+... (at most steps sizes, none below minimum) in ascending order.
+'''
+def geometric_sizes(total, steps, factor, minimum=1):
+  sizes = set()
+  for step in range(max(1, int(steps))):
+    size = int(round(total / float(factor) ** step))
+    if size >= minimum:
+      sizes.add(size)
+  return sorted(sizes)
+
+'''
+The checksums of the source datasets by path, size and modification time.
+'''
+checksums = {}
+
+'''
+Return the checksum of the given source dataset, computed once per process.
+'''
+def checksum(path):
+  path = binary_dataset(path) or path
+  stat = os.stat(path)
+  key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+  if key not in checksums:
+    checksums[key] = file_checksum(path)
+  return checksums[key]
+
+'''
+Return the options of the 'scaling' option of a block with the defaults.
+
+  steps      - The number of sizes of every curve.
+  factor     - The ratio between two consecutive sizes.
+  min_rows   - The minimum number of rows of a subsample.
+  dimensions - Also subsample the columns, with all rows.
+  labels     - The last column of the first dataset is the label, which is
+               kept by the column subsamples.
+  seed       - The seed of the row subsamples.
+'''
+def scaling_options(scaling):
+  options = {"steps": 5, "factor": 2, "min_rows": 10, "dimensions": False,
+    "labels": False, "seed": 0}
+  if isinstance(scaling, dict):
+    options.update(scaling)
+  return options
+
+'''
+Expand the given datasets of a run into the runs of the scaling curves: the
+rows of the first (training) dataset are subsampled with all columns and, with
+the 'dimensions' option, the columns of all datasets are subsampled with all
+rows. The subsamples are nested, every smaller subsample is part of the larger
+ones.
+
+@param datasets - The list of datasets of the run.
+@param scaling - The 'scaling' option of the block.
+@return List of the scaling dicts of the runs, see prepare_scaling().
+'''
+def expand_scaling(datasets, scaling):
+  options = scaling_options(scaling)
+  data = load_csv(resolve_datasets(datasets[0]))
+  rows, columns = data.shape[0], data.shape[1] if data.ndim > 1 else 1
+  features = columns - (1 if options["labels"] else 0)
+
+  sizes = [(size, features) for size in geometric_sizes(rows,
+    options["steps"], options["factor"], options["min_rows"])]
+  if options["dimensions"]:
+    sizes.extend((rows, size) for size in geometric_sizes(features,
+      options["steps"], options["factor"]) if size < features)
+
+  return [{"source": list(datasets), "rows": size, "dimensions": dimensions,
+    "total_rows": rows, "total_dimensions": features,
+    "labels": options["labels"], "seed": options["seed"]} for size,
+    dimensions in sizes]
+
+'''
+Create the subsampled datasets of the given scaling run, unless they exist. The
+subsamples are stored next to the source datasets inside of the '.cache'
+directory, keyed by the checksum of the source and the size, so they are only
+created once. The datasets with as many rows as the first dataset (e.g. its
+labels) are subsampled with the same rows, so they stay aligned with it.
+
+@param scaling - Dict with the source datasets, the number of rows of the first
+                 dataset, the number of feature columns, their full numbers,
+                 the labels option and the seed.
+@return The list of the subsampled datasets.
+'''
+def prepare_scaling(scaling):
+  source = resolve_datasets(scaling["source"])
+  first = load_csv(source[0])
+  columns = first.shape[1] if first.ndim > 1 else 1
+
+  datasets = []
+  for position, path in enumerate(source):
+    data = first if position == 0 else load_csv(path)
+    width = data.shape[1] if data.ndim > 1 else 1
+    # The datasets with the same width as the first dataset have the label
+    # column, which is kept.
+    labels = scaling["labels"] and width == columns
+    aligned = data.shape[0] == first.shape[0]
+    rows = scaling["rows"] if aligned else data.shape[0]
+    if rows >= data.shape[0] and \
+        scaling["dimensions"] >= width - (1 if labels else 0):
+      datasets.append(path)
+      continue
+
+    stem, extension = os.path.splitext(os.path.basename(path))
+    # Relative to the source, so the path is valid on every worker.
+    target = os.path.join(os.path.dirname(path), ".cache",
+      "%s.%s.r%d-d%d-s%d%s" % (stem, checksum(path)[:16], rows,
+      scaling["dimensions"], scaling["seed"], extension))
+    datasets.append(target)
+    if os.path.isfile(target):
+      continue
+
+    selected = list(range(min(scaling["dimensions"], width)))
+    if labels and width - 1 not in selected:
+      selected.append(width - 1)
+
+    # The first rows of a fixed permutation, so the subsamples are nested; the
+    # permutation only depends on the seed and the number of rows, so the
+    # aligned datasets get the same rows.
+    order = np.random.RandomState(scaling["seed"]).permutation(data.shape[0])
+    index = np.sort(order[:rows])
+    sample = data[index][:, selected] if data.ndim > 1 else data[index]
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    atomic_save(target, lambda fid: np.savetxt(fid, sample, delimiter=",",
+      fmt="%.17g"))
+    logging.info('Scaling: created %s.' % target)
+
+  return datasets
+
+'''
+Return the exponent b of the power law runtime = a * size^b, fitted by least
+squares on the log-log scale, or None with less than two sizes.
+'''
+def fit_exponent(sizes, runtimes):
+  points = [(size, runtime) for size, runtime in zip(sizes, runtimes) if
+    size > 0 and runtime > 0]
+  if len(set(size for size, runtime in points)) < 2:
+    return None
+
+  x = np.log([size for size, runtime in points])
+  y = np.log([runtime for size, runtime in points])
+  return float(np.polyfit(x, y, 1)[0])
+
+'''
+This class collects the runtimes of the scaling runs and fits the empirical
+complexity exponent of every curve, i.e. of every block, parameter set, source
+datasets and axis (rows or dimensions).
+'''
+class ScalingReport(object):
+
+  def __init__(self):
+    self.curves = collections.OrderedDict()
+
+  '''
+  Add the result of the given run, if it's a scaling run. The run on the full
+  datasets is part of both curves.
+  '''
+  def add(self, task, status, result):
+    scaling = task.get("scaling")
+    if not scaling or status != "ok":
+      return
+
+    runtime = result.get("runtime")
+    if not isinstance(runtime, (int, float)):
+      return
+
+    param = dict(task["method_param"])
+    param.pop("datasets", None)
+
+    points = []
+    if scaling["dimensions"] == scaling["total_dimensions"]:
+      points.append(("rows", scaling["rows"]))
+    if scaling["rows"] == scaling["total_rows"]:
+      points.append(("dimensions", scaling["dimensions"]))
+
+    for axis, size in points:
+      key = json.dumps([task["name"], task["library"], task["method"], param,
+        scaling["source"], axis], sort_keys=True, default=str)
+      if key not in self.curves:
+        self.curves[key] = {"block": task["name"],
+          "library": task["library"], "method": task["method"],
+          "method_param": param, "datasets": scaling["source"], "axis": axis,
+          "sizes": [], "runtimes": []}
+      self.curves[key]["sizes"].append(size)
+      self.curves[key]["runtimes"].append(float(runtime))
+
+  '''
+  Return the curves with their fitted exponents.
+  '''
+  def fit(self):
+    curves = []
+    for curve in self.curves.values():
+      curve = dict(curve)
+      curve["exponent"] = fit_exponent(curve["sizes"], curve["runtimes"])
+      curves.append(curve)
+    return curves
+
+  '''
+  Log the exponents and write the curves into the given json file.
+  '''
+  def save(self, path):
+    curves = self.fit()
+    if not curves:
+      return
+
+    for curve in curves:
+      logging.info('Scaling: %s %s %s on %s, %s: exponent %s' % (
+        curve["library"], curve["method"], str(curve["method_param"]),
+        str(curve["datasets"]), curve["axis"], "n/a" if curve["exponent"] is
+        None else "%.2f" % curve["exponent"]))
+
+    atomic_save(path, lambda fid: fid.write(json.dumps(curves, indent=2,
+      default=str).encode("utf-8")))
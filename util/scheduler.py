@@ -0,0 +1,238 @@
+'''
+  @file scheduler.py
+
+  Process scheduler to execute independent benchmark runs in parallel.
+'''
+
+import multiprocessing
+import multiprocessing.connection
+import logging
+import heapq
+import os
+
+'''
+Return the list of cores the benchmark process is allowed to run on.
+'''
+def available_cores():
+  if hasattr(os, "sched_getaffinity"):
+    return sorted(os.sched_getaffinity(0))
+  return list(range(multiprocessing.cpu_count()))
+
+'''
+Order the given plan longest-processing-time first: the runs with the longest
+expected runtime are started first, and the short runs fill the gaps between
+the workers at the end, instead of a long run at the end of the plan keeping a
+single worker busy while the others are idle. Runs without an expected runtime
+are assumed to take the mean expected runtime of the other runs.
+
+@param plan - List of runs, each run is a dict.
+@param costs - List of the expected runtimes (or None) in the order of the plan.
+@return Tuple of the ordered plan and the ordered expected runtimes.
+'''
+def order_by_cost(plan, costs):
+  known = [cost for cost in costs if cost is not None]
+  if not known:
+    return list(plan), [0.0] * len(plan)
+
+  default = sum(known) / len(known)
+  costs = [default if cost is None else float(cost) for cost in costs]
+  order = sorted(range(len(plan)), key=lambda index: -costs[index])
+  return [plan[index] for index in order], [costs[index] for index in order]
+
+'''
+Predict the time to execute runs with the given expected runtimes, when every
+run is started in the given order on the first of the given number of slots
+that becomes free.
+'''
+def predict_makespan(costs, slots):
+  finish = [0.0] * max(1, min(int(slots), len(costs)))
+  for cost in costs:
+    heapq.heappush(finish, heapq.heappop(finish) + cost)
+  return max(finish)
+
+'''
+Format the given number of seconds, e.g. '1h 02m 05s'.
+'''
+def format_duration(seconds):
+  minutes, seconds = divmod(int(round(seconds)), 60)
+  hours, minutes = divmod(minutes, 60)
+  if hours:
+    return "%dh %02dm %02ds" % (hours, minutes, seconds)
+  if minutes:
+    return "%dm %02ds" % (minutes, seconds)
+  return "%ds" % seconds
+
+'''
+This class dispatches the runs of a benchmark plan to a set of worker
+processes. Every run reserves the number of cores specified by its "cores" key
+for itself, so that runs never share cores with each other. The results are
+returned in the order of the plan, independent of the order in which the runs
+finish. The optional timeout policy is told about every finished run and can
+skip a run before it is started, and the optional shared datasets are
+published before a run process is started.
+'''
+class Scheduler(object):
+
+  '''
+  Create the scheduler.
+
+  @param jobs - The maximum number of runs executed at the same time.
+  @param execute - Function that executes a single run of the plan and returns
+                   its result.
+  @param policy - The TimeoutPolicy or None.
+  @param shared - The SharedDatasets or None.
+  '''
+  def __init__(self, jobs, execute, policy=None, shared=None):
+    self.jobs = max(1, int(jobs))
+    self.execute = execute
+    self.policy = policy
+    self.shared = shared
+    self.cores = available_cores()
+
+  '''
+  Execute the given plan.
+
+  @param plan - List of runs, each run is a dict.
+  @return Generator over the (run, result) tuples in plan order.
+  '''
+  def run(self, plan):
+    if self.jobs == 1:
+      for task in plan:
+        result = self.skip(task) or self.execute(task)
+        self.update(task, result)
+        yield task, result
+      return
+
+    logging.info('Scheduler: %d jobs on %d cores.' % (self.jobs,
+      len(self.cores)))
+
+    context = multiprocessing.get_context("fork")
+    pending = list(range(len(plan)))
+    running = {}
+    finished = {}
+    free = list(self.cores)
+    emit = 0
+
+    while emit < len(plan):
+      # Start the pending runs in plan order as long as there are enough free
+      # cores for the next one.
+      while pending and len(running) < self.jobs:
+        task = plan[pending[0]]
+        skipped = self.skip(task)
+        if skipped:
+          finished[pending.pop(0)] = skipped
+          continue
+
+        reserve = min(max(0, int(task.get("cores", 1))), len(self.cores))
+        if reserve > len(free):
+          break
+
+        index = pending.pop(0)
+        cores, free = free[:reserve], free[reserve:]
+
+        self.acquire(task)
+        reader, writer = context.Pipe(duplex=False)
+        process = context.Process(target=self.worker,
+          args=(task, cores, writer))
+        process.start()
+        writer.close()
+        running[reader] = (index, process, cores)
+
+      # Every pending run may have been skipped.
+      ready = multiprocessing.connection.wait(list(running.keys())) \
+        if running else []
+      for reader in ready:
+        index, process, cores = running.pop(reader)
+        try:
+          finished[index] = reader.recv()
+        except EOFError:
+          finished[index] = self.crashed(process)
+        reader.close()
+        process.join()
+        free = sorted(free + cores)
+        self.release(plan[index])
+        self.update(plan[index], finished[index])
+
+      while emit in finished:
+        yield plan[emit], finished.pop(emit)
+        emit += 1
+
+  '''
+  Return the result of the given run if the timeout policy skips it, or None.
+  The shared datasets of a skipped run are given back.
+  '''
+  def skip(self, task):
+    skipped = self.policy.skip(task) if self.policy else None
+    if skipped and self.shared:
+      self.shared.skip(task)
+    return skipped
+
+  '''
+  Tell the timeout policy about the result of the given run.
+  '''
+  def update(self, task, result):
+    if self.policy:
+      self.policy.update(task, result[0])
+
+  '''
+  Publish the shared datasets of the given run before it's started.
+  '''
+  def acquire(self, task):
+    if self.shared:
+      self.shared.acquire(task)
+
+  '''
+  Release the shared datasets of the given finished run.
+  '''
+  def release(self, task):
+    if self.shared:
+      self.shared.release(task)
+
+  '''
+  Execute a single run inside of its own worker process pinned to the given
+  cores and wait for its result.
+
+  @param task - The run.
+  @param cores - The list of cores, default no pinning.
+  @return The result of the run.
+  '''
+  def execute_isolated(self, task, cores=None):
+    context = multiprocessing.get_context("fork")
+    self.acquire(task)
+    reader, writer = context.Pipe(duplex=False)
+    process = context.Process(target=self.worker,
+      args=(task, cores or [], writer))
+    process.start()
+    writer.close()
+
+    try:
+      result = reader.recv()
+    except EOFError:
+      result = self.crashed(process)
+    reader.close()
+    process.join()
+    self.release(task)
+    return result
+
+  '''
+  Execute a single run inside of a worker process pinned to the given cores.
+  '''
+  def worker(self, task, cores, writer):
+    if cores and hasattr(os, "sched_setaffinity"):
+      os.sched_setaffinity(0, cores)
+
+    result = self.execute(task)
+    try:
+      writer.send(result)
+    except Exception as e:
+      logging.error('Exception: %s' % (str(e)))
+      writer.send(("error", None))
+    writer.close()
+
+  '''
+  Create the result for a worker process that died without returning one.
+  '''
+  def crashed(self, process):
+    process.join()
+    logging.error('Worker exited with code %s.' % (str(process.exitcode)))
+    return ("error", None)
@@ -0,0 +1,510 @@
+'''
+  @file session.py
+
+  Persistent interpreter sessions shared by the benchmark scripts.
+
+  Starting an interpreter like the JVM for every benchmark run is often more
+  expensive than the benchmarked method itself. A session keeps the
+  interpreter alive between the runs: the interpreter is owned by a small
+  detached server process, which the scripts of all runs (including runs in
+  parallel worker processes) talk to over a unix socket inside of a private
+  (mode 0700) directory of the benchmark invocation. The server executes
+  one request at a time and exits after it was idle for a while or when
+  shutdown_sessions() is called.
+
+  The interpreter reads the requests from its stdin and has to terminate the
+  output of every request with a line that starts with '__END__', followed by
+  the exit status of the request.
+'''
+
+import os
+import re
+import sys
+import json
+import time
+import fcntl
+import shutil
+import socket
+import select
+import struct
+import zipfile
+import hashlib
+import shlex
+import tempfile
+import subprocess
+import numpy as np
+
+from util import run_command, read_csv
+
+'''
+The marker that terminates the output of a request.
+'''
+END_MARKER = b"__END__"
+
+'''
+Options of the sessions, set with configure_sessions().
+'''
+session_param = {"jvm_server": False, "jvm_warmup": 0, "matlab_server": False,
+  "matlab_command": "", "matlab_script_path": "methods/matlab/",
+  "r_server": False, "r_workers": 1, "session_idle": 600,
+  "weka_class_path": "methods/weka/"}
+
+'''
+Set the session options from the given run parameters.
+'''
+def configure_sessions(run_param):
+  for key in session_param:
+    if key in run_param:
+      session_param[key] = run_param[key]
+
+'''
+Create the private directory of the session servers of this benchmark
+invocation. The directory is only accessible by the user of the benchmark, so
+no other user can connect to the servers and execute code as this user. It is
+passed to the runs, including the ones in forked worker processes, in the
+BENCHMARK_SESSIONS environment variable.
+'''
+def start_sessions():
+  os.environ["BENCHMARK_SESSIONS"] = tempfile.mkdtemp(
+    prefix="benchmark-sessions-")
+
+'''
+Return the directory that contains the sockets of the session servers of this
+benchmark invocation.
+'''
+def session_directory():
+  if not os.environ.get("BENCHMARK_SESSIONS"):
+    start_sessions()
+
+  directory = os.environ["BENCHMARK_SESSIONS"]
+  stat = os.stat(directory)
+  if stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+    raise Exception("session directory " + directory + " isn't private.")
+  return directory
+
+'''
+Send a message, a length prefixed json document, over the given socket.
+'''
+def send_message(connection, message):
+  # Numpy scalars are converted into the corresponding python numbers.
+  data = json.dumps(message, default=lambda value: value.item() if
+    hasattr(value, "item") else str(value)).encode("utf-8")
+  connection.sendall(struct.pack("!I", len(data)) + data)
+
+'''
+Receive a message sent with send_message() from the given socket.
+'''
+def receive_message(connection):
+  def receive(size):
+    data = b""
+    while len(data) < size:
+      chunk = connection.recv(size - len(data))
+      if not chunk:
+        raise EOFError("connection closed")
+      data += chunk
+    return data
+
+  size = struct.unpack("!I", receive(4))[0]
+  return json.loads(receive(size).decode("utf-8"))
+
+'''
+Read the output of the given interpreter process until the end marker.
+
+@return Tuple of the output, the end marker line and the status, which is one
+        of 'ok', 'timeout' or 'exited'.
+'''
+def read_response(process, deadline):
+  fd = process.stdout.fileno()
+  data = b""
+  while True:
+    start = 0 if data.startswith(END_MARKER) else data.find(b"\n" + END_MARKER)
+    if start >= 0:
+      end = data.find(b"\n", start + 1)
+      if end >= 0:
+        return data[:start], data[start:end].strip(), "ok"
+
+    remaining = None
+    if deadline is not None:
+      remaining = deadline - time.monotonic()
+      if remaining <= 0:
+        return data, b"", "timeout"
+
+    ready, _, _ = select.select([fd], [], [], remaining)
+    if not ready:
+      return data, b"", "timeout"
+
+    chunk = os.read(fd, 65536)
+    if not chunk:
+      return data, b"", "exited"
+    data += chunk
+
+'''
+Run the session server: start the interpreter with the given command on the
+first request and pass the requests of the clients to it, until the server was
+idle for the given number of seconds.
+
+@param address - The path of the unix socket of the server.
+@param idle - Number of idle seconds until the server exits.
+@param command - The command that starts the interpreter.
+'''
+def serve(address, idle, command):
+  workdir = tempfile.mkdtemp(prefix="session-")
+  listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  listener.bind(address)
+  listener.listen(16)
+  listener.settimeout(idle)
+
+  process = None
+  try:
+    while True:
+      try:
+        connection, _ = listener.accept()
+      except socket.timeout:
+        break
+
+      with connection:
+        try:
+          request = receive_message(connection)
+        except (EOFError, OSError, ValueError):
+          continue
+
+        if request.get("quit"):
+          break
+
+        if process is None or process.poll() is not None:
+          process = subprocess.Popen(command, stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=workdir)
+
+        # Start every request with an empty working directory.
+        for name in os.listdir(workdir):
+          shutil.rmtree(os.path.join(workdir, name), ignore_errors=True)
+
+        deadline = None
+        if request.get("timeout"):
+          deadline = time.monotonic() + float(request["timeout"])
+
+        try:
+          process.stdin.write(request["input"].encode("utf-8"))
+          process.stdin.flush()
+          output, marker, status = read_response(process, deadline)
+        except OSError:
+          output, marker, status = b"", b"", "exited"
+
+        if status != "ok":
+          process.kill()
+          process.wait()
+          process = None
+
+        # Hand the files the request created over to the client.
+        if request.get("collect") and request.get("cwd"):
+          for name in os.listdir(workdir):
+            shutil.move(os.path.join(workdir, name),
+              os.path.join(request["cwd"], name))
+
+        try:
+          send_message(connection, {"status": status,
+            "output": output.decode("utf-8", "replace"),
+            "marker": marker.decode("utf-8", "replace")})
+        except OSError:
+          pass
+  finally:
+    if os.path.exists(address):
+      os.remove(address)
+    if process is not None:
+      process.kill()
+      process.wait()
+    listener.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+'''
+This class is the client of a pool of session servers. A server of the pool is
+started on the first call that uses it, if it isn't already running. Every
+call reserves one server of the pool for itself, so the calls of parallel runs
+are passed to different interpreters as long as there is a free one.
+'''
+class Session(object):
+
+  '''
+  Create the session.
+
+  @param command - The command that starts the interpreter, with absolute
+                   paths.
+  @param collect - Move the files the interpreter writes into its working
+                   directory into the working directory of the caller.
+  @param workers - The number of interpreters in the pool.
+  '''
+  def __init__(self, command, collect=False, workers=1):
+    self.command = command
+    self.collect = collect
+    self.workers = max(1, int(workers))
+
+    self.key = hashlib.sha1("\0".join(command).encode("utf-8")).hexdigest()[:16]
+    self.directory = session_directory()
+
+  '''
+  Pass the given input to the interpreter and wait for the response.
+
+  @param text - The request for the interpreter.
+  @param timeout - The time until the interpreter is killed.
+  @return Tuple of the status ('ok', 'timeout' or 'exited'), the output and the
+          end marker line.
+  '''
+  def call(self, text, timeout=None):
+    lock, address = self.reserve()
+    with lock:
+      connection = self.connect(address)
+      with connection:
+        send_message(connection, {"input": text, "timeout": timeout,
+          "cwd": os.getcwd(), "collect": self.collect})
+        response = receive_message(connection)
+
+    return response["status"], response["output"], response["marker"]
+
+  '''
+  Reserve a server of the pool, wait for a busy one if all servers are busy.
+
+  @return Tuple of the open lock file, which holds the reservation until it is
+          closed, and the socket of the server.
+  '''
+  def reserve(self):
+    # Start the search at a different server for every process, so the
+    # processes don't all wait for the same server.
+    first = os.getpid() % self.workers
+    slots = list(range(first, self.workers)) + list(range(first))
+
+    for flags in [fcntl.LOCK_EX | fcntl.LOCK_NB, fcntl.LOCK_EX]:
+      for slot in slots:
+        address = os.path.join(self.directory, "%s-%d.sock" % (self.key, slot))
+        lock = open(address + ".busy", "w")
+        try:
+          fcntl.flock(lock, flags)
+          return lock, address
+        except BlockingIOError:
+          lock.close()
+
+  '''
+  Connect to the server with the given socket, start it if it isn't running.
+  '''
+  def connect(self, address):
+    connection = self.open(address)
+    if connection:
+      return connection
+
+    with open(address + ".lock", "w") as lock:
+      fcntl.flock(lock, fcntl.LOCK_EX)
+
+      # Another process may have started the server in the meantime.
+      connection = self.open(address)
+      if connection:
+        return connection
+
+      if os.path.exists(address):
+        os.remove(address)
+
+      subprocess.Popen([sys.executable, os.path.abspath(__file__),
+        address, str(session_param["session_idle"])] + self.command,
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL, cwd=tempfile.gettempdir(),
+        start_new_session=True)
+
+      for i in range(600):
+        connection = self.open(address)
+        if connection:
+          return connection
+        time.sleep(0.05)
+
+    raise Exception("session server for " + str(self.command) +
+      " did not start.")
+
+  '''
+  Open a connection to the running server with the given socket.
+  '''
+  def open(self, address):
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+      connection.connect(address)
+      return connection
+    except OSError:
+      connection.close()
+      return None
+
+'''
+Stop all session servers of this benchmark invocation.
+'''
+def shutdown_sessions():
+  directory = os.environ.get("BENCHMARK_SESSIONS")
+  if not directory or not os.path.isdir(directory):
+    return
+
+  for name in os.listdir(directory):
+    if name.endswith(".sock"):
+      try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+          connection.connect(os.path.join(directory, name))
+          send_message(connection, {"quit": True})
+      except OSError:
+        pass
+
+  shutil.rmtree(directory, ignore_errors=True)
+
+'''
+Convert the response of a session into the result of run_command(): return
+the output or raise the exception run_command() would raise.
+'''
+def check_response(cmd, timeout, status, output, marker):
+  output = output.encode("utf-8")
+  if status == "timeout":
+    raise subprocess.TimeoutExpired(cmd, timeout, output=output)
+  if status != "ok" or marker != "__END__ 0":
+    raise subprocess.CalledProcessError(1, cmd, output=output)
+
+  return output
+
+'''
+Return the main class of the given jar file.
+'''
+def jar_main_class(jar):
+  with zipfile.ZipFile(jar) as archive:
+    manifest = archive.read("META-INF/MANIFEST.MF").decode("utf-8")
+
+  # Long manifest lines continue on the next line, starting with a space.
+  manifest = manifest.replace("\r\n", "\n").replace("\n ", "")
+  for line in manifest.splitlines():
+    if line.startswith("Main-Class:"):
+      return line.split(":", 1)[1].strip()
+
+  raise Exception("no Main-Class in " + jar)
+
+'''
+Run the given java command, just like run_command(). If the 'jvm_server'
+option is set, the main class is executed inside of a persistent JVM instead
+of a new one (see methods/weka/src/BenchmarkServer.java). In this case the
+class is executed 'jvm_warmup' times before the measured execution and the
+output additionally contains the cold and steady-state timings of the JVM.
+
+@param cmd - The java command, e.g. ['java', '-classpath', path, 'Class', ...]
+             or ['java', '-jar', 'file.jar', ...].
+@param timeout - The time until the command is killed. Default no timeout.
+@return The output of the command.
+'''
+def run_java(cmd, timeout=None):
+  if not session_param["jvm_server"]:
+    return run_command(cmd, timeout)
+
+  options = []
+  for index in range(1, len(cmd)):
+    if cmd[index] in ["-classpath", "-cp"]:
+      classpath, main, args = cmd[index + 1], cmd[index + 2], cmd[index + 3:]
+      break
+    elif cmd[index] == "-jar":
+      classpath, main = cmd[index + 1], jar_main_class(cmd[index + 1])
+      args = cmd[index + 2:]
+      break
+    options.append(cmd[index])
+  else:
+    raise Exception("no main class in " + str(cmd))
+
+  classpath = os.pathsep.join([os.path.abspath(path) for path in
+    classpath.split(os.pathsep)] + [session_param["weka_class_path"]])
+  session = Session([cmd[0]] + options + ["-classpath", classpath,
+    "BenchmarkServer"], collect=True)
+
+  status, output, marker = session.call("\t".join(
+    [str(int(session_param["jvm_warmup"])), main] + args) + "\n", timeout)
+
+  return check_response(cmd, timeout, status, output, marker)
+
+'''
+Run the given matlab command, just like run_command(). If the 'matlab_server'
+option is set, the function call of the command is executed inside of a
+persistent MATLAB session instead of a new MATLAB process. The session is
+started with the 'matlab_command' option if set, e.g. to substitute MATLAB by
+'octave-cli', otherwise with the MATLAB executable of the given command.
+
+@param cmd - The matlab command, e.g. ['matlab', '-nodisplay', '-nosplash',
+             '-r', "try, KMEANS('...'), catch, exit(1), end, exit(0)"].
+@param timeout - The time until the command is killed. Default no timeout.
+@return The output of the command.
+'''
+def run_matlab(cmd, timeout=None):
+  if not session_param["matlab_server"]:
+    return run_command(cmd, timeout)
+
+  index = cmd.index("-r")
+  match = re.match(r"try, (.*), catch, exit\(1\), end, exit\(0\)$",
+    cmd[index + 1])
+  if not match:
+    raise Exception("unsupported matlab command " + str(cmd))
+
+  if session_param["matlab_command"]:
+    session = Session(shlex.split(session_param["matlab_command"]))
+  else:
+    session = Session(cmd[:index])
+
+  # Execute the call inside of the working directory of the caller, so the
+  # written files end up in the scratch directory of the run.
+  request = "cd('" + os.getcwd().replace("'", "''") + "'); "
+  if session_param["matlab_script_path"]:
+    request += "addpath('" + \
+      session_param["matlab_script_path"].replace("'", "''") + "'); "
+  request += "try, " + match.group(1) + ", status = 0; " + \
+    "catch err, disp(err.message), status = 1; end, " + \
+    "fprintf('\\n__END__ %d\\n', status);\n"
+
+  status, output, marker = session.call(request, timeout)
+
+  return check_response(cmd, timeout, status, output, marker)
+
+'''
+Run the given Rscript command, just like run_command(). If the 'r_server'
+option is set, the script is executed by one of 'r_workers' persistent R
+workers (see methods/R/worker.r) instead of a new R process. The workers keep
+the packages loaded and the parsed datasets in memory, and return the timings
+and the predictions of the script in 'timings.bin' and 'predictions.bin'; use
+r_runtime() and r_predictions() to read the results in both modes.
+
+@param cmd - The Rscript command, e.g. ['Rscript', 'methods/R/nbc.r', ...].
+@param timeout - The time until the command is killed. Default no timeout.
+@return The output of the command.
+'''
+def run_r(cmd, timeout=None):
+  if not session_param["r_server"]:
+    return run_command(cmd, timeout)
+
+  script = os.path.abspath(cmd[1])
+  session = Session([cmd[0], os.path.join(os.path.dirname(script),
+    "worker.r")], workers=session_param["r_workers"])
+
+  # Execute the script inside of the working directory of the caller, so the
+  # written files end up in the scratch directory of the run.
+  status, output, marker = session.call("\t".join([os.getcwd(), script] +
+    cmd[2:]) + "\n", timeout)
+
+  return check_response(cmd, timeout, status, output, marker)
+
+'''
+Return the runtime of the timed section of an R script executed with run_r().
+
+@param output - The output of the script.
+'''
+def r_runtime(output):
+  if os.path.exists("timings.bin"):
+    timings = np.fromfile("timings.bin", dtype="<f8")
+    if len(timings) > 0:
+      return float(timings[0])
+
+  return float(re.findall(r"(\d+\.\d+). *sec elapsed",
+    output.decode("utf-8"))[0])
+
+'''
+Return the predictions of an R script executed with run_r().
+'''
+def r_predictions():
+  if os.path.exists("predictions.bin"):
+    return np.fromfile("predictions.bin", dtype="<f8")
+
+  # Skip the header line of the csv file.
+  return read_csv("predictions.csv")[1:]
+
+if __name__ == "__main__":
+  serve(sys.argv[1], float(sys.argv[2]), sys.argv[3:])
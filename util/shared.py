@@ -0,0 +1,239 @@
+'''
+  @file shared.py
+
+  Datasets published in shared memory for the parallel benchmark runs.
+'''
+
+import os
+import logging
+import threading
+import collections
+
+import numpy as np
+
+from multiprocessing import shared_memory
+
+from util import dataset_cache, binary_dataset, load_csv
+from synthetic import is_synthetic, synthetic_path
+
+'''
+This class publishes the datasets of the runs before the run processes are
+forked, so the runs on the same dataset map a single read-only copy instead of
+loading the dataset each (see DatasetCache.load()). A dataset in the binary
+dataset cache is published as its memory map, which the run processes inherit,
+so the data is only held once by the page cache. Only a dataset that isn't
+memory mapped (e.g. of a dataset directory that isn't writable) is copied into
+a POSIX shared memory block, within the budget.
+
+Every published dataset counts the runs that use it: a dataset is removed once
+no running run uses it and no run of the plan (see expect()) is left, the runs
+skipped by the timeout policy are given back with skip(). Without a plan (on
+the workers of a distributed benchmark), a memory map is removed as soon as no
+running run uses it, since it's cheap to map again, while the unused shared
+memory blocks are kept until their memory is needed for another dataset.
+Every dataset left is removed by close(). Synthetic datasets are never
+generated here, they are published once a run generated them.
+'''
+class SharedDatasets(object):
+
+  '''
+  Create the shared datasets.
+
+  @param budget - The maximum number of bytes in shared memory; zero disables
+                  the shared datasets.
+  '''
+  def __init__(self, budget=0):
+    self.budget = budget
+    self.lock = threading.Lock()
+    # The shared memory block (None for a memory map), the view, the number of
+    # running runs and the dataset cache key by path.
+    self.blocks = collections.OrderedDict()
+    self.bytes = 0
+    self.remaining = collections.Counter()
+    # The paths of the published datasets each running run holds, by run.
+    self.acquired = {}
+    self.planned = False
+
+  '''
+  Return the absolute paths of the datasets of the given run that can be
+  shared, without generating the synthetic datasets.
+  '''
+  def paths(self, task):
+    paths = []
+    for dataset in task["method_param"]["datasets"]:
+      path = synthetic_path(dataset) if is_synthetic(dataset) else dataset
+      if path.endswith(".csv") or binary_dataset(path):
+        paths.append(os.path.abspath(path))
+    return paths
+
+  '''
+  Count the runs of the given plan on every dataset.
+  '''
+  def expect(self, plan):
+    if self.budget <= 0:
+      return
+
+    with self.lock:
+      self.planned = True
+      for task in plan:
+        for path in self.datasets(task):
+          self.remaining[path] += 1
+
+  '''
+  Publish the datasets of the given run, which is about to be started. Call
+  release() when the run is finished.
+  '''
+  def acquire(self, task):
+    if self.budget <= 0:
+      return
+
+    with self.lock:
+      acquired = []
+      for path in self.datasets(task):
+        if path not in self.blocks:
+          self.publish(path)
+        if path in self.blocks:
+          self.blocks[path][2] += 1
+          self.blocks.move_to_end(path)
+          acquired.append(path)
+      self.acquired[id(task)] = acquired
+
+  '''
+  Release the datasets of the given finished run.
+  '''
+  def release(self, task):
+    if self.budget <= 0:
+      return
+
+    with self.lock:
+      for path in self.acquired.pop(id(task), []):
+        if path in self.blocks:
+          self.blocks[path][2] -= 1
+      self.forget(task)
+
+  '''
+  Give back the datasets of the given run of the plan, which was skipped
+  without being started.
+  '''
+  def skip(self, task):
+    if self.budget <= 0:
+      return
+
+    with self.lock:
+      self.forget(task)
+
+  '''
+  Count the given run of the plan as done and remove its datasets that aren't
+  needed any more. The caller holds the lock.
+  '''
+  def forget(self, task):
+    for path in self.datasets(task):
+      self.remaining[path] -= 1
+      if path not in self.blocks or self.blocks[path][2] > 0:
+        continue
+
+      if self.planned:
+        unused = self.remaining[path] <= 0
+      else:
+        unused = self.blocks[path][0] is None
+      if unused:
+        self.remove(path)
+
+  '''
+  Return the paths of the shared datasets of the given run, or an empty list
+  if a dataset can't be found.
+  '''
+  def datasets(self, task):
+    try:
+      return self.paths(task)
+    except Exception as e:
+      logging.debug('Shared datasets: %s' % str(e))
+      return []
+
+  '''
+  Publish the given dataset: the memory map of the binary dataset cache, or a
+  copy in a new shared memory block if it fits into the budget and into the
+  shared memory file system. A synthetic dataset that wasn't generated yet
+  isn't published. The caller holds the lock.
+  '''
+  def publish(self, path):
+    if not os.path.isfile(path) and not binary_dataset(path):
+      return
+
+    try:
+      key = dataset_cache.key(path)
+      data = load_csv(path)
+    except Exception as e:
+      logging.warning('Shared datasets: %s: %s' % (path, str(e)))
+      return
+
+    if isinstance(data, np.memmap):
+      self.blocks[path] = [None, data, 0, key]
+      dataset_cache.shared[key] = data
+      logging.info('Shared datasets: mapped %s.' % path)
+      return
+
+    if data.nbytes > self.budget:
+      return
+
+    # Make room by removing the least recently used datasets of no running run.
+    for stale in [p for p, (block, view, users, k) in self.blocks.items() if
+        block is not None and users <= 0]:
+      if self.bytes + data.nbytes <= self.budget:
+        break
+      self.remove(stale)
+    if self.bytes + data.nbytes > self.budget or not self.available(data.nbytes):
+      return
+
+    block = shared_memory.SharedMemory(create=True, size=max(1, data.nbytes))
+    view = np.ndarray(data.shape, dtype=data.dtype, buffer=block.buf)
+    view[...] = data
+    view.setflags(write=False)
+
+    self.blocks[path] = [block, view, 0, key]
+    self.bytes += data.nbytes
+    dataset_cache.shared[key] = view
+    logging.info('Shared datasets: published %s (%d bytes).' % (path,
+      data.nbytes))
+
+  '''
+  Return whether the shared memory file system has room for the given number
+  of bytes. A write beyond its size kills the process, so the check is done
+  before the block is filled.
+  '''
+  def available(self, size):
+    if not os.path.isdir("/dev/shm"):
+      return True
+
+    stat = os.statvfs("/dev/shm")
+    return stat.f_bavail * stat.f_frsize > size
+
+  '''
+  Remove the given dataset. The forked run processes keep their mappings until
+  they exit. The caller holds the lock.
+  '''
+  def remove(self, path):
+    block, view, users, key = self.blocks.pop(path)
+    dataset_cache.shared.pop(key, None)
+    if block is None:
+      return
+
+    self.bytes -= view.nbytes
+    del view
+    try:
+      block.close()
+    except BufferError:
+      # A view is still referenced, the mapping is released with it.
+      pass
+    block.unlink()
+
+  '''
+  Remove all datasets.
+  '''
+  def close(self):
+    with self.lock:
+      for path in list(self.blocks.keys()):
+        self.remove(path)
+
+  def __str__(self):
+    return "%d bytes in %d datasets" % (self.bytes, len(self.blocks))
@@ -5,62 +5,107 @@
   SQLite database driver.
 '''
 
+import os
+import time
 import sqlite3
 
+from database import Database
+
 '''
-SQLite driver class to write the into a SQLite database.
+SQLite driver class to write the into a SQLite database, using the normalized
+schema of database.py. The driver holds a single connection in WAL mode and
+buffers the results; the buffered results are written in a single transaction
+when 'sqlite_batch_size' results are buffered, when the oldest buffered result
+is older than 'sqlite_flush_interval' seconds and when the driver is closed.
+A ResultWriter turns off 'autoflush' and flushes the driver at these points
+itself, so it knows which results were written.
+The driver is the only writer of the database, the results of parallel worker
+processes are passed to the driver by the runner process.
 '''
-class Driver(object):
+class Driver(Database):
+
+  transient_errors = (sqlite3.OperationalError,)
+
   def __init__(self, param):
     self.build = 1
     self.database = param["sqlite_database"]
+    self.batch_size = max(1, int(param.get("sqlite_batch_size", 64)))
+    self.flush_interval = float(param.get("sqlite_flush_interval", 30))
     self.connection = None
     self.cursor = None
+    self.buffer = []
+    self.buffer_time = None
+    self.autoflush = True
+    self.pid = None
+    self.configure_retries(param)
 
     self.connect()
-    self.create_table()
+    self.create_tables()
     self.latest_build()
 
   def connect(self):
-    self.connection = sqlite3.connect(self.database)
+    # The connection is used by the background writer thread.
+    self.connection = sqlite3.connect(self.database, check_same_thread=False)
     self.connection.execute('pragma foreign_keys = on')
+    self.connection.execute('pragma journal_mode = wal')
+    self.connection.execute('pragma synchronous = normal')
     self.cursor = self.connection.cursor()
+    self.pid = os.getpid()
 
-  def create_table(self):
-    comand = """
-        CREATE TABLE IF NOT EXISTS results (
-          id INTEGER PRIMARY KEY %s,
-          build INTEGER NOT NULL,
-          library TEXT NOT NULL,
-          datasets TEXT NOT NULL,
-          method TEXT NOT NULL,
-          method_param TEXT NOT NULL,
-          base_param TEXT NOT NULL,
-          runtime REAL NOT NULL,
-          result TEXT NOT NULL
-        );
-        """
-    self.connection.executescript(comand % "AUTOINCREMENT")
+  '''
+  Return True if the given table exists.
+  '''
+  def has_table(self, table):
+    self.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND "
+      "name = ?", (table,))
+    return self.cursor.fetchone()[0] > 0
 
-  def latest_build(self):
-    with self.connection:
-      command = "SELECT build FROM results ORDER BY build DESC"
-      self.cursor.execute(command)
-      result = self.cursor.fetchall()
+  '''
+  Create the given index.
+  '''
+  def create_index(self, name, table, columns):
+    self.execute("CREATE INDEX IF NOT EXISTS %s ON %s (%s)" % (name, table,
+      ", ".join(columns)))
 
-      if result:
-        self.build = int(result[0][0]) + 1
+  def latest_build(self):
+    self.build = self.last_build() + 1
 
   def update(self, library, method, datasets, method_param, base_param, result):
-    self.connect()
-    with self.connection:
-      command = "INSERT INTO results VALUES (NULL,%s,%s,%s,%s,%s,%s,%s,%s)"
+    # A forked process must not share the connection or the buffered results
+    # of its parent.
+    if self.pid != os.getpid():
+      self.buffer = []
+      self.connect()
 
-      runtime = 0
-      if "runtime" in result:
-        runtime = result["runtime"]
+    self.buffer.append((self.build, library, datasets, method, method_param,
+      base_param, result))
+    if self.buffer_time is None:
+      self.buffer_time = time.monotonic()
 
-      self.cursor.execute(command % ('?', '?', '?', '?', '?', '?', '?', '?'),
-        (self.build, str(library), str(datasets), str(method),
-        str(method_param), str(base_param), runtime, str(result)))
-      self.cursor.execute("SELECT last_insert_rowid()")
+    if self.autoflush and (len(self.buffer) >= self.batch_size or
+        time.monotonic() - self.buffer_time >= self.flush_interval):
+      self.flush()
+
+  '''
+  Write the buffered results in a single transaction.
+  '''
+  def flush(self):
+    if not self.buffer or self.pid != os.getpid():
+      return
+
+    self.insert_runs(self.buffer)
+
+    self.buffer = []
+    self.buffer_time = None
+
+  '''
+  Write the buffered results and close the connection.
+  '''
+  def close(self):
+    if self.connection is None:
+      return
+
+    self.flush()
+    if self.pid == os.getpid():
+      self.connection.close()
+    self.connection = None
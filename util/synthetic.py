@@ -0,0 +1,270 @@
+'''
+  @file synthetic.py
+
+  Deterministic synthetic datasets, generated in chunks directly into the
+  binary dataset cache.
+
+  A synthetic dataset is given by a spec instead of a path in the 'files' list
+  of a method block:
+
+    synthetic:<generator>(<name>=<value>, ...)[/<part>]
+
+  e.g. 'synthetic:blobs(n=10000000, d=64, k=20, seed=1)/train'. The generators
+  draw n points with d dimensions (see GENERATORS); the part selects the data
+  set of the benchmark:
+
+    data   - All points without the labels (default).
+    train  - The first points, with the label as last column.
+    test   - The remaining 'test' fraction (default 0.2) of the points.
+    labels - The labels of the test points.
+'''
+
+import os
+import re
+import json
+import hashlib
+import logging
+import tempfile
+
+import numpy as np
+
+from util import binary_dataset
+
+'''
+The version of the generators, part of the key of the generated datasets.
+Increment it when a generator changes its output.
+'''
+VERSION = 1
+
+'''
+The directory of the generated datasets.
+'''
+SYNTHETIC_PATH = os.path.join("datasets", ".cache", "synthetic")
+
+'''
+The number of points drawn from one random generator. It determines the output
+of the generators, so it's part of the key of the generated datasets.
+'''
+CHUNK_ROWS = 1 << 16
+
+PARTS = ["data", "train", "test", "labels"]
+
+'''
+Return the centers of the clusters of the blobs and classification generators.
+'''
+def centers(rng, param, scale):
+  return rng.uniform(-scale, scale, (int(param["k"]), int(param["d"])))
+
+'''
+Isotropic gaussian clusters around k uniformly drawn centers, the label is the
+cluster (clustering).
+'''
+def blobs(rng, chunk_rng, rows, param):
+  means = centers(rng, param, param.get("scale", 10.0))
+  labels = chunk_rng.integers(0, len(means), rows)
+  points = means[labels] + chunk_rng.normal(0, param.get("std", 1.0),
+    (rows, len(means[0])))
+  return points, labels
+
+'''
+Like blobs, but with overlapping clusters, the label is the class
+(classification).
+'''
+def classification(rng, chunk_rng, rows, param):
+  param = dict(param)
+  param.setdefault("k", 2)
+  param.setdefault("scale", 1.0)
+  return blobs(rng, chunk_rng, rows, param)
+
+'''
+Gaussian points with a linear response plus gaussian noise (regression).
+'''
+def regression(rng, chunk_rng, rows, param):
+  weights = rng.normal(0, 1, int(param["d"]))
+  points = chunk_rng.normal(0, 1, (rows, len(weights)))
+  return points, points.dot(weights) + chunk_rng.normal(0,
+    param.get("noise", 0.1), rows)
+
+'''
+Uniformly distributed points in the unit cube, without labels (nearest
+neighbours, like the randu datasets).
+'''
+def randu(rng, chunk_rng, rows, param):
+  return chunk_rng.random((rows, int(param["d"]))), None
+
+'''
+The generators by name and the defaults of their parameters; all generators
+take the number of points 'n', the dimensions 'd', the 'seed' and the 'test'
+fraction.
+'''
+GENERATORS = {
+  "blobs": (blobs, {"k": 8, "std": 1.0, "scale": 10.0}),
+  "classification": (classification, {"k": 2, "std": 1.0, "scale": 1.0}),
+  "regression": (regression, {"noise": 0.1}),
+  "randu": (randu, {}),
+}
+
+SPEC = re.compile(r"^synthetic:(\w+)\((.*)\)(?:/(\w+))?$")
+
+'''
+Return whether the given dataset is a synthetic dataset spec.
+'''
+def is_synthetic(dataset):
+  return isinstance(dataset, str) and dataset.startswith("synthetic:")
+
+'''
+Parse the given spec.
+
+@param spec - The synthetic dataset spec.
+@return Tuple of the generator name, the dict of all parameters (with the
+        defaults) and the part.
+'''
+def parse_spec(spec):
+  match = SPEC.match(spec.replace(" ", ""))
+  if not match:
+    raise Exception("invalid synthetic dataset: " + spec)
+
+  generator, arguments, part = match.groups()
+  if generator not in GENERATORS:
+    raise Exception("unknown synthetic dataset generator: " + generator)
+  part = part or "data"
+  if part not in PARTS:
+    raise Exception("unknown part of the synthetic dataset: " + part)
+
+  param = {"seed": 0, "test": 0.2}
+  param.update(GENERATORS[generator][1])
+  for argument in filter(None, arguments.split(",")):
+    name, _, value = argument.partition("=")
+    try:
+      value = float(value)
+    except ValueError:
+      raise Exception("invalid value of %s in %s" % (name, spec))
+    param[name] = int(value) if value.is_integer() else value
+
+  for name in ["n", "d"]:
+    if not isinstance(param.get(name), int) or param[name] < 1:
+      raise Exception("%s needs a positive integer %s" % (spec, name))
+  return generator, param, part
+
+'''
+Return the key of the given generator and parameters, the name of the
+directory of the generated datasets.
+'''
+def spec_key(generator, param):
+  checksum = hashlib.sha256(json.dumps([generator, param, VERSION, CHUNK_ROWS],
+    sort_keys=True).encode("utf-8")).hexdigest()
+  return "%s-%s" % (generator, checksum[:16])
+
+'''
+Return the rows of the given part as a (start, stop) range of the points.
+'''
+def part_rows(param, part):
+  train = param["n"] - int(param["n"] * param["test"])
+  if part == "train":
+    return 0, train
+  if part in ["test", "labels"]:
+    return train, param["n"]
+  return 0, param["n"]
+
+'''
+Return the shape of the given synthetic dataset.
+'''
+def synthetic_shape(spec):
+  generator, param, part = parse_spec(spec)
+  start, stop = part_rows(param, part)
+  if part == "labels":
+    return (stop - start,)
+
+  columns = param["d"]
+  if part == "train" and generator != "randu":
+    columns += 1
+  return (stop - start, columns)
+
+'''
+Return the path of the given synthetic dataset without generating it. The path
+is the one of a csv file, which only exists after a script that requires the
+csv format asked for it (see export_csv()), the data is stored in the binary
+file next to it.
+'''
+def synthetic_path(spec):
+  generator, param, part = parse_spec(spec)
+  return os.path.join(SYNTHETIC_PATH, spec_key(generator, param), part + ".csv")
+
+'''
+Return the path of the given synthetic dataset (see synthetic_path()), which is
+generated unless it exists.
+
+@param spec - The synthetic dataset spec.
+@return The path of the dataset.
+'''
+def synthetic_dataset(spec):
+  path = synthetic_path(spec)
+  if binary_dataset(path):
+    return path
+
+  generator, param, part = parse_spec(spec)
+  directory = os.path.dirname(path)
+  if generator == "randu" and part == "labels":
+    raise Exception("%s has no labels" % spec)
+
+  os.makedirs(directory, exist_ok=True)
+  with open(os.path.join(directory, "spec.json"), "w") as fid:
+    json.dump({"generator": generator, "param": param, "version": VERSION},
+      fid, indent=2)
+
+  generate(spec, path + ".npy")
+  return path
+
+'''
+Generate the given synthetic dataset into the given binary file. The points
+are drawn in chunks of CHUNK_ROWS, each from its own random generator, and
+written through a temporary memory map, so the file is written atomically
+and only the rows of the requested part are drawn.
+'''
+def generate(spec, target):
+  generator, param, part = parse_spec(spec)
+  function = GENERATORS[generator][0]
+  start, stop = part_rows(param, part)
+  shape = synthetic_shape(spec)
+  logging.info('Synthetic dataset: generating %s %s.' % (spec, str(shape)))
+
+  fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target),
+    prefix="." + os.path.basename(target))
+  os.close(fd)
+  try:
+    output = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float64,
+      shape=shape)
+    for chunk in range(start // CHUNK_ROWS, (stop - 1) // CHUNK_ROWS + 1):
+      first = chunk * CHUNK_ROWS
+      rows = min(CHUNK_ROWS, param["n"] - first)
+
+      # The model (centers, weights) and every chunk have their own stream.
+      points, labels = function(np.random.default_rng([param["seed"], 0]),
+        np.random.default_rng([param["seed"], 1, chunk]), rows, param)
+
+      low, high = max(start, first) - first, min(stop, first + rows) - first
+      offset = first + low - start
+      if part == "labels":
+        output[offset:offset + high - low] = labels[low:high]
+      else:
+        output[offset:offset + high - low, :param["d"]] = points[low:high]
+        if part == "train" and labels is not None:
+          output[offset:offset + high - low, -1] = labels[low:high]
+
+    output.flush()
+    del output
+    os.replace(tmp, target)
+  except:
+    if os.path.exists(tmp):
+      os.remove(tmp)
+    raise
+
+'''
+Return the given datasets with the synthetic dataset specs replaced by the
+paths of the generated datasets.
+'''
+def resolve_datasets(datasets):
+  if isinstance(datasets, str):
+    return synthetic_dataset(datasets) if is_synthetic(datasets) else datasets
+  return [synthetic_dataset(dataset) if is_synthetic(dataset) else dataset for
+    dataset in datasets]
@@ -7,6 +7,8 @@
 
 import os.path
 
+from util import last_line
+
 '''
 Text driver class to write the output to a text file.
 '''
@@ -18,14 +20,11 @@ class Driver(object):
     self.latest_build()
 
   def latest_build(self):
-    if os.path.isfile(self.file):
-      with open(self.file, 'r') as f:
-        lines = f.read().splitlines()
-        if len(lines) > 0:
-          last_line = lines[-1]
-          splits = last_line.split(";")
-          if len(splits) > 0:
-            self.build = int(splits[0]) + 1
+    line = last_line(self.file)
+    if line:
+      splits = line.split(";")
+      if len(splits) > 0:
+        self.build = int(splits[0]) + 1
 
   def update(self, library, method, datasets, method_param, base_param, result):
     with open(self.file, "a+") as f:
@@ -36,3 +35,12 @@ class Driver(object):
       f.write('%s;%s;%s;%s;%s;%s;%s;%s;\n' % (self.build, str(library),
         str(datasets), str(method), str(method_param), str(base_param),
         runtime, str(result)))
+
+  '''
+  The results are written immediately, there is nothing to flush or close.
+  '''
+  def flush(self):
+    pass
+
+  def close(self):
+    pass
@@ -0,0 +1,130 @@
+'''
+  @file timeouts.py
+
+  Timeouts of the benchmark runs and skipping of runs that would time out.
+'''
+
+import os
+import json
+import logging
+import threading
+
+import numpy as np
+
+from synthetic import is_synthetic, synthetic_shape
+
+'''
+Return the timeout of a run of the given block on the given datasets. The
+'timeout' option of the block overrides the timeout of the base config, and the
+'dataset_timeouts' option of the block (a dict from the dataset to the timeout)
+overrides the timeout for single datasets.
+
+@param values - The options of the block.
+@param datasets - The list of datasets of the run.
+@param base_param - The base config.
+@return The timeout in seconds.
+'''
+def block_timeout(values, datasets, base_param):
+  timeout = values.get("timeout", base_param["timeout"])
+
+  overrides = values.get("dataset_timeouts") or {}
+  matches = [overrides[dataset] for dataset in datasets if dataset in overrides]
+  if matches:
+    timeout = max(matches)
+  return timeout
+
+'''
+Return the total size of the given datasets in bytes, the size of the binary
+data for the synthetic datasets.
+'''
+def datasets_size(datasets):
+  size = 0
+  for dataset in datasets:
+    try:
+      if is_synthetic(dataset):
+        size += int(np.prod(synthetic_shape(dataset))) * 8
+        continue
+      size += os.path.getsize(dataset)
+    except Exception:
+      continue
+  return size
+
+'''
+This class derives the timeouts of the runs from their expected runtime and
+decides which runs are skipped, because a run of the same block and parameter
+set on smaller datasets timed out.
+
+The options of the base config are:
+
+  adaptive_timeout    - Limit the timeout of a run with a known runtime to this
+                        factor times the runtime of all its calls (warm-up and
+                        trials), 0 disables the adaptive timeouts.
+  min_timeout         - The minimum adaptive timeout in seconds.
+  skip_after_timeout  - Skip the runs on larger datasets after a timeout.
+'''
+class TimeoutPolicy(object):
+
+  def __init__(self, base_param):
+    self.factor = float(base_param.get("adaptive_timeout") or 0)
+    self.minimum = float(base_param.get("min_timeout") or 0)
+    self.skip_larger = bool(base_param.get("skip_after_timeout", False))
+    self.lock = threading.Lock()
+    # The smallest dataset size that timed out, by block and parameter set.
+    self.timed_out = {}
+
+  '''
+  Return the timeout of the given run with the given expected runtime of a
+  single call (or None). The adaptive timeout never exceeds the configured
+  timeout of the run.
+  '''
+  def timeout(self, task, cost):
+    timeout = task["timeout"]
+    if self.factor <= 0 or cost is None:
+      return timeout
+
+    trial_param = task.get("trial_param") or {}
+    calls = int(trial_param.get("warmup") or 0) + \
+      max(1, int(trial_param.get("trials") or 1))
+    return min(timeout, max(self.minimum, self.factor * cost * calls))
+
+  '''
+  Return the key of the block and parameter set of the given run.
+  '''
+  def key(self, task):
+    param = dict(task["method_param"])
+    param.pop("datasets", None)
+    return json.dumps([task["name"], task.get("version", ""), param],
+      sort_keys=True, default=str)
+
+  '''
+  Record the status of the given finished run.
+  '''
+  def update(self, task, status):
+    if status != "timeout" or not self.skip_larger:
+      return
+
+    size = datasets_size(task["method_param"]["datasets"])
+    with self.lock:
+      key = self.key(task)
+      self.timed_out[key] = min(size, self.timed_out.get(key, size))
+
+  '''
+  Return the result of the given run if it's skipped, because a run of the same
+  block and parameter set on smaller datasets timed out, or None.
+  '''
+  def skip(self, task):
+    if not self.skip_larger:
+      return None
+
+    with self.lock:
+      limit = self.timed_out.get(self.key(task))
+    if limit is None:
+      return None
+
+    size = datasets_size(task["method_param"]["datasets"])
+    if size <= limit:
+      return None
+
+    logging.warning('Skip %s on %s: timed out on smaller datasets.' % (
+      task["name"], str(task["method_param"]["datasets"])))
+    return ("skipped", {"reason": "timed out on %d bytes of data" % limit})
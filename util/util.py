@@ -16,6 +16,16 @@ import os
 import imp
 import copy
 import shlex
+import hashlib
+import json
+import re
+import collections
+import threading
+import shutil
+import tempfile
+import warnings
+import logging
+import concurrent.futures
 
 try:
   import subprocess32 as subprocess
@@ -61,7 +71,9 @@ class Loader(object):
     return module
 
 '''
-This class contains a function to mesure the time.
+This class contains a function to mesure the time. Besides the elapsed wall
+clock time, measured with the high resolution performance counter, the timer
+also measures the CPU time of the process and of the current thread.
 '''
 class Timer(object):
 
@@ -69,19 +81,224 @@ class Timer(object):
   Start the timer.
   '''
   def __enter__(self):
-    self.__start = time.time()
+    self.__start = (time.perf_counter_ns(), time.process_time_ns(),
+      time.thread_time_ns())
+    return self
 
   '''
   Stop the timer.
   '''
   def __exit__(self, type, value, traceback):
-    self.__finish = time.time()
+    self.__finish = (time.perf_counter_ns(), time.process_time_ns(),
+      time.thread_time_ns())
 
   '''
   Return the elapsed time of the timer.
   '''
   def ElapsedTime(self):
-    return self.__finish - self.__start
+    return (self.__finish[0] - self.__start[0]) / 1e9
+
+  '''
+  Return the CPU time of the process (user and system) while the timer was
+  running.
+  '''
+  def CPUTime(self):
+    return (self.__finish[1] - self.__start[1]) / 1e9
+
+  '''
+  Return the CPU time of the current thread while the timer was running.
+  '''
+  def ThreadTime(self):
+    return (self.__finish[2] - self.__start[2]) / 1e9
+
+'''
+Resource usage of the child processes started with run_command(), one
+resource.struct_rusage for every process.
+'''
+child_usage = []
+
+'''
+Run the given command and return its output, just like
+subprocess.check_output() with stderr redirected to stdout. The child process
+is reaped with os.wait4(), so that its resource usage (user and system time,
+maximum resident set size, context switches and page faults) is recorded in
+child_usage.
+
+@param cmd - The command to run.
+@param timeout - The time until the command is killed. Default no timeout.
+@param shell - Execute the command through the shell.
+@return The output of the command.
+'''
+def run_command(cmd, timeout=None, shell=False):
+  process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+    stderr=subprocess.STDOUT, shell=shell)
+
+  output = []
+  reader = threading.Thread(target=lambda: output.append(process.stdout.read()))
+  reader.daemon = True
+  reader.start()
+
+  try:
+    reader.join(timeout)
+    expired = reader.is_alive()
+    if expired:
+      process.kill()
+      reader.join()
+  except BaseException:
+    # The run was interrupted, e.g. by the timeout of the benchmark.
+    process.kill()
+    process.wait()
+    raise
+
+  process.stdout.close()
+  if hasattr(os, "wait4"):
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    child_usage.append(usage)
+  else:
+    process.wait()
+
+  output = output[0] if output else b""
+  if expired:
+    raise subprocess.TimeoutExpired(cmd, timeout, output=output)
+  if process.returncode:
+    raise subprocess.CalledProcessError(process.returncode, cmd, output=output)
+
+  return output
+
+'''
+This class measures the resources used by a section of code: the timers of the
+Timer class and the resource usage of the child processes started with
+run_command() inside of the section.
+'''
+class ResourceMonitor(object):
+
+  '''
+  Start the measurement.
+  '''
+  def __enter__(self):
+    del child_usage[:]
+    self.timer = Timer()
+    self.timer.__enter__()
+    return self
+
+  '''
+  Stop the measurement.
+  '''
+  def __exit__(self, type, value, traceback):
+    self.timer.__exit__(type, value, traceback)
+    self.usage = list(child_usage)
+    del child_usage[:]
+
+  '''
+  Return the measured resources as metric dict.
+  '''
+  def Metric(self):
+    metric = {}
+    metric["wall_time"] = self.timer.ElapsedTime()
+    metric["cpu_time"] = self.timer.CPUTime()
+    metric["thread_time"] = self.timer.ThreadTime()
+
+    if self.usage:
+      metric["child_user_time"] = sum(u.ru_utime for u in self.usage)
+      metric["child_sys_time"] = sum(u.ru_stime for u in self.usage)
+      metric["child_max_rss"] = max(u.ru_maxrss for u in self.usage)
+      metric["child_voluntary_switches"] = sum(u.ru_nvcsw for u in self.usage)
+      metric["child_involuntary_switches"] = sum(u.ru_nivcsw
+        for u in self.usage)
+      metric["child_minor_faults"] = sum(u.ru_minflt for u in self.usage)
+      metric["child_major_faults"] = sum(u.ru_majflt for u in self.usage)
+
+    return metric
+
+'''
+Return the directory in which the scratch directories of the benchmark runs are
+created. Unless 'scratch_path' is set in the given run parameters a memory
+backed file system is preferred over the default temporary directory.
+'''
+def scratch_root(run_param):
+  if run_param.get("scratch_path"):
+    return run_param["scratch_path"]
+
+  if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK | os.X_OK):
+    return "/dev/shm"
+
+  return tempfile.gettempdir()
+
+'''
+Return a copy of the given parameters with the relative dataset and '_path'
+entries converted into absolute paths, so they stay valid after the working
+directory has been changed.
+'''
+def absolute_param(param):
+  def absolute(path):
+    if isinstance(path, str) and path and not os.path.isabs(path):
+      return os.path.join(os.getcwd(), path)
+    return path
+
+  param = copy.deepcopy(param)
+  for key, value in param.items():
+    if key == "datasets":
+      if isinstance(value, (list,)):
+        param[key] = [absolute(d) for d in value]
+      else:
+        param[key] = absolute(value)
+    elif key.endswith("_path"):
+      param[key] = absolute(value)
+
+  return param
+
+'''
+This class provides an isolated scratch directory for a single benchmark run.
+While the context is active the scratch directory is the current working
+directory, so the output and prediction files the scripts write and read back
+with a relative path can't collide with the files of other runs. The directory
+is removed when the context exits.
+'''
+class ScratchDirectory(object):
+
+  # The scratch directory of the active run.
+  current = None
+
+  '''
+  Create the scratch directory context.
+
+  @param root - The directory to create the scratch directory in.
+  '''
+  def __init__(self, root=None):
+    self.root = root
+    self.path = None
+
+  '''
+  Create the scratch directory and change into it.
+  '''
+  def __enter__(self):
+    self.__cwd = os.getcwd()
+    self.path = tempfile.mkdtemp(prefix="benchmark-", dir=self.root)
+    os.chdir(self.path)
+    self.__previous, ScratchDirectory.current = ScratchDirectory.current, \
+      self.path
+    return self.path
+
+  '''
+  Change back into the previous working directory and remove the scratch
+  directory.
+  '''
+  def __exit__(self, type, value, traceback):
+    ScratchDirectory.current = self.__previous
+    os.chdir(self.__cwd)
+    shutil.rmtree(self.path, ignore_errors=True)
+
+  '''
+  Return whether the given file is inside of the scratch directory of the
+  active run, i.e. an output file of the run.
+  '''
+  @staticmethod
+  def contains(path):
+    if ScratchDirectory.current is None:
+      return False
+    return os.path.realpath(path).startswith(os.path.join(
+      os.path.realpath(ScratchDirectory.current), ""))
 
 '''
 Parse the mlpack timer from the given data.
@@ -129,6 +346,30 @@ def parse_weka_timer(data):
 
   return timer
 
+'''
+Parse the timer of the persistent JVM (see session.run_java()) from the given
+data.
+'''
+def parse_jvm_timer(data):
+  if isinstance(data, bytes):
+    data = data.decode("utf-8")
+
+  timer_start = False
+  timer = {}
+  for line in data.splitlines():
+    if line.strip() == "jvm":
+      timer_start = True
+      continue
+
+    if timer_start == True and line.endswith("s"):
+      splits = line.split(" ")
+      if len(splits) >= 2:
+        timer_name = splits[len(splits) - 2][0:-1]
+        timer_value = splits[len(splits) - 1][0:-1]
+        timer[timer_name] = float(timer_value)
+
+  return timer
+
 '''
 Parse the matlab timer from the given data.
 '''
@@ -158,38 +399,169 @@ def parse_timer(data):
     return parse_mlpack_timer(data)
 
 '''
-Add arff header to the given data.s
+Add arff header to the given data and write it to the given arff file.
 '''
 def add_arff_header(data, new_data):
-  # Extract the dataset name.
-  relationName = os.path.splitext(os.path.basename(data))[0].split('_')[0]
-
-  # Read the first line to count the attributes.
-  fid = open(data)
-  head = [next(fid) for x in range(1)]
-  fid.close()
-
-  # We can convert files with ' ' and ',' as seperator.
-  count = max(head[0].count(","), head[0].count(" ")) + 1
-
-  # Write the arff header to the new file.
-  nfid = open(new_data, "a")
-  nfid.write("@relation " + relationName + "\n\n")
-  for i in range(count):
-    nfid.write("@attribute " + data + "_dim" + str(i) + " NUMERIC\n")
-  nfid.write("\n@data\n")
-
-  # Append the data for the given file to the new arff file.
-  fid = open(data, "r")
-  while True:
-    line = fid.read(65536)
-    if line:
-      nfid.write(line)
-    else:
-      break
+  convert_arff(data, new_data)
+
+'''
+Return True if the given string is a number.
+'''
+def is_number(value):
+  try:
+    float(value)
+    return True
+  except ValueError:
+    return False
 
-  fid.close()
-  nfid.close()
+'''
+Return the given nominal value, quoted if necessary.
+'''
+def arff_value(value):
+  if value and not any(c in value for c in " ,'\"{}%\t\\"):
+    return value
+  return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+'''
+Return the path of the record of the given converted arff file.
+'''
+def arff_record_path(target):
+  return os.path.join(dataset_cache_path(target),
+    os.path.basename(target) + ".json")
+
+'''
+Return True if the given arff file was converted from the current content of
+the given source file, False if the source changed since and None if the arff
+file wasn't converted by convert_arff().
+'''
+def arff_current(source, target):
+  try:
+    with open(arff_record_path(target), "r") as fid:
+      record = json.load(fid)
+    stat = os.stat(source)
+    if record["size"] == stat.st_size and record["mtime"] == stat.st_mtime_ns:
+      return True
+    return record["checksum"] == file_checksum(source)
+  except (OSError, ValueError, KeyError):
+    return None
+
+'''
+Return True if the given arff file was written by the previous version of
+add_arff_header(), which named the attributes after the path of the csv file
+and may have left an incomplete file behind.
+'''
+def legacy_arff(target):
+  with open(target, "r", errors="replace") as fid:
+    head = fid.read(4096)
+  return re.search(r"@attribute \S+\.(csv|txt)_dim0 NUMERIC", head) is not None
+
+'''
+Convert the given csv file (separated by ',' or whitespace) into an arff file.
+The file is streamed three times: to count the columns and find the non-numeric
+columns, to collect the values of the nominal attributes, and to write the arff
+file. The arff file is written to a temporary file, which is renamed when the
+conversion is complete, and the checksum of the csv file is recorded in the
+'.cache' directory, so stale conversions are detected.
+
+@param source - The path of the csv file.
+@param target - The path of the arff file.
+@param nominal_class - Declare the last column as nominal class attribute.
+'''
+def convert_arff(source, target, nominal_class=False):
+  def rows():
+    with open(source, "r") as fid:
+      for line in fid:
+        line = line.strip()
+        if line:
+          yield [value.strip() for value in line.split(",")] if "," in line \
+            else line.split()
+
+  # The number of columns and the columns with non-numeric values.
+  columns = 0
+  numeric = []
+  for row in rows():
+    if len(row) > columns:
+      numeric.extend([True] * (len(row) - columns))
+      columns = len(row)
+    for i, value in enumerate(row):
+      if numeric[i] and value != "?" and not is_number(value):
+        numeric[i] = False
+
+  nominal = [i for i in range(columns) if not numeric[i]]
+  if nominal_class and columns and numeric[-1]:
+    nominal.append(columns - 1)
+
+  values = dict((i, set()) for i in nominal)
+  if values:
+    for row in rows():
+      for i in values:
+        if i < len(row) and row[i] != "?":
+          values[i].add(row[i])
+
+  relation = os.path.splitext(os.path.basename(source))[0].split('_')[0]
+
+  def write(fid):
+    fid.write(("@relation " + arff_value(relation) + "\n\n").encode())
+    for i in range(columns):
+      name = "class" if nominal_class and i == columns - 1 else \
+        relation + "_dim" + str(i)
+      if i in values:
+        # Numeric class values are sorted by their value.
+        ordered = sorted(values[i], key=float) if numeric[i] else \
+          sorted(values[i])
+        kind = "{" + ",".join(arff_value(v) for v in ordered) + "}"
+      else:
+        kind = "NUMERIC"
+      fid.write(("@attribute " + arff_value(name) + " " + kind + "\n").encode())
+    fid.write(b"\n@data\n")
+
+    lines = []
+    for row in rows():
+      row = row + ["?"] * (columns - len(row))
+      lines.append(",".join(arff_value(value) if i in values and value != "?"
+        else value for i, value in enumerate(row)))
+      if len(lines) >= 4096:
+        fid.write(("\n".join(lines) + "\n").encode())
+        lines = []
+    if lines:
+      fid.write(("\n".join(lines) + "\n").encode())
+
+  stat = os.stat(source)
+  checksum = file_checksum(source)
+  atomic_save(target, write)
+
+  record = {"source": os.path.basename(source), "size": stat.st_size,
+    "mtime": stat.st_mtime_ns, "checksum": checksum,
+    "nominal_class": nominal_class}
+  try:
+    os.makedirs(dataset_cache_path(target), exist_ok=True)
+    atomic_save(arff_record_path(target),
+      lambda fid: fid.write(json.dumps(record).encode()))
+  except OSError:
+    pass
+
+'''
+Return the arff file of the given csv file, converted if it doesn't exist or if
+the csv file changed since the conversion. An arff file next to the csv file
+that wasn't converted by the benchmark (e.g. downloaded with the dataset) is
+used as it is. The conversion with a nominal class attribute is stored in a
+separate '.nominal.arff' file.
+
+@param path - The path of the csv file.
+@param nominal_class - Declare the last column as nominal class attribute.
+@return The path of the arff file.
+'''
+def prepare_arff(path, nominal_class=False):
+  stem = os.path.splitext(path)[0]
+  twin = stem + ".arff"
+  if os.path.isfile(twin) and arff_current(path, twin) is None and \
+      not legacy_arff(twin):
+    return twin
+
+  target = stem + ".nominal.arff" if nominal_class else twin
+  if not os.path.isfile(target) or not arff_current(path, target):
+    convert_arff(path, target, nominal_class)
+  return target
 
 '''
 Pretty subprocess exception output.
@@ -200,6 +572,68 @@ def subprocess_exception(e, output):
   else:
     raise Exception(str(e))
 
+'''
+Two-sided 95% quantiles of the student t distribution for the given degrees of
+freedom. The degrees of freedom between the tabulated ones use the quantile of
+the next smaller key, which is larger than the exact quantile, so the interval
+is never too narrow.
+'''
+T_QUANTILES = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447,
+  7: 2.365, 8: 2.306, 9: 2.262, 10: 2.228, 11: 2.201, 12: 2.179, 13: 2.160,
+  14: 2.145, 15: 2.131, 20: 2.086, 25: 2.060, 30: 2.042, 40: 2.021, 60: 2.000,
+  120: 1.980}
+
+'''
+Return the width of the 95% confidence interval of the mean of the given
+samples relative to the mean.
+'''
+def confidence_width(samples):
+  if len(samples) < 2:
+    return float("inf")
+
+  samples = np.asarray(samples, dtype=np.float64)
+  mean = samples.mean()
+  if mean == 0:
+    return float("inf")
+
+  df = len(samples) - 1
+  quantile = T_QUANTILES[max(key for key in T_QUANTILES if key <= df)]
+
+  return 2 * quantile * samples.std(ddof=1) / math.sqrt(len(samples)) / mean
+
+'''
+Return the statistical summary of the given samples.
+'''
+def summarize(samples):
+  samples = np.asarray(samples, dtype=np.float64)
+  q1, median, q3 = np.percentile(samples, [25, 50, 75])
+  return {"min": float(samples.min()), "median": float(median),
+    "mean": float(samples.mean()),
+    "stddev": float(samples.std(ddof=1)) if len(samples) > 1 else 0.0,
+    "iqr": float(q3 - q1), "samples": samples.tolist()}
+
+'''
+Combine the metric results of repeated trials into a single result. The result
+of the last trial is extended with the summary of every numeric metric, which
+is stored in the 'trials' entry; the runtime is the median of all trials.
+'''
+def combine_trials(results):
+  result = dict(results[-1])
+  if len(results) <= 1:
+    return result
+
+  trials = {}
+  for key, value in result.items():
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and \
+        all(key in r for r in results):
+      trials[key] = summarize([r[key] for r in results])
+
+  if "runtime" in trials:
+    result["runtime"] = trials["runtime"]["median"]
+  result["trials"] = trials
+
+  return result
+
 '''
 Extend the given param if the sweep option is set.
 '''
@@ -231,39 +665,380 @@ def param_extension(param):
 
   return options
 
+'''
+Return the sha256 checksum of the given file.
+'''
+def file_checksum(path):
+  checksum = hashlib.sha256()
+  with open(path, "rb") as fid:
+    while True:
+      block = fid.read(1 << 20)
+      if not block:
+        break
+      checksum.update(block)
+
+  return checksum.hexdigest()
+
+'''
+Return the path of the cache directory for the given dataset.
+'''
+def dataset_cache_path(path):
+  return os.path.join(os.path.dirname(os.path.abspath(path)), ".cache")
+
+'''
+Return the binary file of the given csv dataset if the dataset is stored in
+binary form (e.g. the synthetic datasets, see synthetic.py) or None. The binary
+file is the '.npy' file next to the csv file, which needn't exist.
+'''
+def binary_dataset(path):
+  binary = path + ".npy"
+  return binary if os.path.isfile(binary) else None
+
+'''
+Write the csv file of the given dataset that is stored in binary form, unless
+it exists. The rows are written in chunks, through a temporary file.
+'''
+def export_csv(path, chunk_rows=1 << 16):
+  binary = binary_dataset(path)
+  if binary is None or os.path.isfile(path):
+    return
+
+  data = np.load(binary, mmap_mode="r")
+  logging.info('Dataset: writing %s.' % path)
+  def write(fid):
+    for start in range(0, data.shape[0], chunk_rows):
+      np.savetxt(fid, data[start:start + chunk_rows], delimiter=",",
+        fmt="%.17g")
+  atomic_save(path, write)
+
+'''
+Parse the given csv file of numbers. The file is split into chunks on line
+boundaries, which are parsed concurrently by a pool of threads (the numpy
+parser releases the GIL) into a preallocated array. Files with missing values,
+text fields or rows of different lengths are parsed with genfromtxt, which
+turns the invalid fields into nan.
+
+@param path - The path to the csv file.
+@param dtype - The type of the array.
+@param threads - The number of threads, default the number of available cores.
+@return Numpy array with the content of the csv file, shaped like the result of
+        genfromtxt.
+'''
+def read_csv(path, dtype=np.float64, threads=None, chunk_size=1 << 22):
+  if threads is None:
+    threads = len(os.sched_getaffinity(0)) if \
+      hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+  with open(path, "rb") as fid:
+    data = fid.read()
+
+  # Split the file into chunks of complete lines.
+  chunks = []
+  start = 0
+  while start < len(data):
+    end = data.find(b"\n", start + chunk_size)
+    end = len(data) if end < 0 else end + 1
+    chunk = data[start:end].strip()
+    if chunk:
+      chunks.append(chunk)
+    start = end
+
+  if not chunks:
+    return np.genfromtxt(path, delimiter=',', dtype=dtype)
+
+  first = chunks[0].split(b"\n", 1)[0]
+  columns = first.count(b",") + 1
+  counts = [chunk.count(b"\n") + 1 for chunk in chunks]
+  offsets = np.cumsum([0] + counts)
+  result = np.empty((offsets[-1], columns), dtype=dtype)
+
+  def parse(index):
+    chunk = chunks[index].replace(b"\r", b"").replace(b"\n", b",")
+    # Missing values (',,') can't be parsed, and the parser stops at the
+    # first text field.
+    if b",," in chunk or chunk.startswith(b",") or chunk.endswith(b","):
+      return False
+    try:
+      with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        values = np.fromstring(chunk, dtype=dtype, sep=",")
+    except ValueError:
+      return False
+    if values.size != counts[index] * columns:
+      return False
+    result[offsets[index]:offsets[index + 1]] = values.reshape(-1, columns)
+    return True
+
+  if threads > 1 and len(chunks) > 1:
+    with concurrent.futures.ThreadPoolExecutor(min(threads,
+        len(chunks))) as executor:
+      parsed = all(executor.map(parse, range(len(chunks))))
+  else:
+    parsed = all(parse(index) for index in range(len(chunks)))
+
+  if not parsed:
+    return np.genfromtxt(path, delimiter=',', dtype=dtype)
+
+  # Like genfromtxt, a single row or column is returned as vector.
+  if result.shape[0] == 1 or columns == 1:
+    return result.ravel()
+  return result
+
+'''
+Load the given csv file. The parsed data is stored in a binary file inside of
+the '.cache' directory next to the dataset, keyed by the checksum of the csv
+file. As long as the csv file is unchanged, the data is loaded from this
+binary file as read-only memory map instead of parsing the csv file again.
+
+@param path - The path to the csv file.
+@return Numpy array with the content of the csv file.
+'''
+def load_csv(path):
+  # The output files of a run are read once and removed with the run.
+  if ScratchDirectory.contains(path):
+    return read_csv(path)
+
+  binary = binary_dataset(path)
+  if binary:
+    return np.load(binary, mmap_mode="r")
+
+  cache = dataset_cache_path(path)
+  name = os.path.basename(path)
+  index = os.path.join(cache, name + ".json")
+  stat = os.stat(path)
+
+  # Use the cache entry directly if the file hasn't been touched since it was
+  # checksummed.
+  try:
+    with open(index, "r") as fid:
+      entry = json.load(fid)
+    binary = os.path.join(cache, entry["binary"])
+    if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns \
+        and os.path.isfile(binary):
+      return np.load(binary, mmap_mode="r")
+  except (OSError, ValueError, KeyError):
+    entry = None
+
+  checksum = file_checksum(path)
+  binary = os.path.join(cache, name + "." + checksum[:16] + ".npy")
+
+  if not os.path.isfile(binary):
+    data = read_csv(path)
+    try:
+      os.makedirs(cache, exist_ok=True)
+      atomic_save(binary, lambda fid: np.save(fid, data))
+    except OSError:
+      # The dataset directory is not writable, use the parsed data.
+      return data
+
+  try:
+    # Remove the binary file of the previous content of the csv file.
+    if entry and entry.get("checksum") != checksum:
+      previous = os.path.join(cache, entry["binary"])
+      if os.path.isfile(previous):
+        os.remove(previous)
+
+    entry = {"size": stat.st_size, "mtime": stat.st_mtime_ns,
+      "checksum": checksum, "binary": os.path.basename(binary)}
+    atomic_save(index, lambda fid: fid.write(json.dumps(entry).encode()))
+  except OSError:
+    pass
+
+  return np.load(binary, mmap_mode="r")
+
+'''
+This class implements a least recently used cache for the datasets loaded
+within one benchmark process, so the scripts of different runs don't load the
+same dataset over and over again. The entries are keyed by the path and the
+modification time of the dataset and the cached arrays are read-only, since
+they are shared between the runs.
+'''
+class DatasetCache(object):
+
+  '''
+  Create the cache.
+
+  @param budget - The maximum number of bytes held by the cache; zero
+                  disables the cache.
+  '''
+  def __init__(self, budget=0):
+    self.budget = budget
+    self.entries = collections.OrderedDict()
+    self.bytes = 0
+    self.hits = 0
+    self.misses = 0
+    # The read-only views of the datasets in shared memory by key, see
+    # shared.py.
+    self.shared = {}
+
+  '''
+  Set the memory budget of the cache and evict entries that exceed it.
+  '''
+  def configure(self, budget):
+    self.budget = budget
+    self.evict()
+
+  '''
+  Return the key of the given dataset: the absolute path, the modification
+  time and the size of the file.
+  '''
+  def key(self, path):
+    path = os.path.abspath(path)
+    stat = os.stat(binary_dataset(path) or path)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+  '''
+  Load the given csv file, either from shared memory, from the cache or from
+  the file system.
+  '''
+  def load(self, path):
+    if ScratchDirectory.contains(path):
+      return load_csv(path)
+
+    key = self.key(path)
+    if key in self.shared:
+      self.hits += 1
+      return self.shared[key]
+
+    if key in self.entries:
+      self.hits += 1
+      self.entries.move_to_end(key)
+      return self.entries[key]
+
+    self.misses += 1
+    data = load_csv(key[0])
+    data.setflags(write=False)
+
+    if self.budget > 0 and data.nbytes <= self.budget:
+      # Drop the entries of previous versions of the file.
+      for stale in [k for k in self.entries if k[0] == key[0]]:
+        self.bytes -= self.entries.pop(stale).nbytes
+
+      self.entries[key] = data
+      self.bytes += data.nbytes
+      self.evict()
+
+    return data
+
+  '''
+  Remove the least recently used entries until the cache fits its budget.
+  '''
+  def evict(self):
+    while self.entries and self.bytes > self.budget:
+      key, data = self.entries.popitem(last=False)
+      self.bytes -= data.nbytes
+
+  def __str__(self):
+    return "%d hits, %d misses, %d bytes in %d datasets" % (self.hits,
+      self.misses, self.bytes, len(self.entries))
+
+'''
+The dataset cache shared by all scripts of the benchmark process.
+'''
+dataset_cache = DatasetCache()
+
+'''
+Write a file atomically: the content is written to a temporary file in the
+same directory which is then renamed, so a crashed write never leaves a
+partial file behind.
+
+@param path - The path of the file to write.
+@param write - Function that writes the content to the given binary file
+               object.
+'''
+def atomic_save(path, write):
+  fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path),
+    prefix="." + os.path.basename(path))
+  try:
+    with os.fdopen(fd, "wb") as fid:
+      write(fid)
+    os.replace(tmp, path)
+  except:
+    if os.path.exists(tmp):
+      os.remove(tmp)
+    raise
+
+'''
+Return the last complete (newline terminated) and non-empty line of the given
+file. The file is read backwards from the end in blocks, so the time doesn't
+depend on the size of the file.
+
+@param path - The path of the file.
+@return The line without the newline or None.
+'''
+def last_line(path, block=65536):
+  if not os.path.isfile(path):
+    return None
+
+  with open(path, "rb") as fid:
+    position = fid.seek(0, os.SEEK_END)
+    data = b""
+    while position > 0:
+      size = min(block, position)
+      position -= size
+      fid.seek(position)
+      data = fid.read(size) + data
+
+      # Ignore an incomplete last line, e.g. of an interrupted write.
+      end = data.rfind(b"\n")
+      if end < 0:
+        continue
+
+      content = data[:end].rstrip()
+      start = content.rfind(b"\n")
+      if content and (start >= 0 or position == 0):
+        return content[start + 1:].decode("utf-8")
+
+  return None
+
 '''
 Load the given datasets if supported.
 '''
 def load_dataset(datasets, support):
-  datasets = check_dataset(datasets, support)
+  if isinstance(datasets, str):
+    datasets = [datasets]
+
+  # The datasets stored in binary form are loaded without their csv file.
+  datasets = [d if "csv" in support and binary_dataset(d) else
+    check_dataset(d, support)[0] for d in datasets]
   # if isinstance(datasets, str):
   #   datasets = [datasets]
 
   if len(datasets) == 1 and "csv" in support:
-      return (np.genfromtxt(datasets[0], delimiter=','),)
+      return (dataset_cache.load(datasets[0]),)
   if len(datasets) == 2 and "csv" in support:
-      result = (np.genfromtxt(datasets[0], delimiter=','),
-                np.genfromtxt(datasets[1], delimiter=','))
+      result = (dataset_cache.load(datasets[0]),
+                dataset_cache.load(datasets[1]))
       return result
   if len(datasets) == 3 and "csv" in support:
-      result = (np.genfromtxt(datasets[0], delimiter=','),
-                np.genfromtxt(datasets[1], delimiter=','),
-                np.genfromtxt(datasets[2], delimiter=','))
+      result = (dataset_cache.load(datasets[0]),
+                dataset_cache.load(datasets[1]),
+                dataset_cache.load(datasets[2]))
       return result
 
 '''
 Check if the specified dataset exists.
 '''
-def check_dataset(datasets, support):
+def check_dataset(datasets, support, nominal_class=False):
   if isinstance(datasets, str):
     datasets = [datasets]
 
   d_idx = 0
   for d in datasets:
+    # The csv file of a dataset stored in binary form is written on demand.
+    export_csv(d)
+
     if not os.path.exists(d):
       raise Exception("file  " + str(d) + " not found.")
     extension = os.path.splitext(d)[1][1:]
 
+    # The arff files are converted from the csv files, the last column of the
+    # first (training) dataset is the class attribute.
+    if "arff" in support and extension not in support:
+      datasets[d_idx] = prepare_arff(d, nominal_class and d_idx == 0)
+      d_idx += 1
+      continue
+
     check = False
     for s in support:
       data_supported = d[0:len(d) - len(extension)] + s
@@ -273,14 +1048,7 @@ def check_dataset(datasets, support):
         break
 
     if not check:
-      if ex == "arff":
-        add_arff_header(d, data_supported)
-        datasets[d_idx] = data_supported
-      else:
-        if os.path.isfile(data_supported):
-          datasets[d_idx] = data_supported
-        else:
-          raise Exception("No conversion possible.")
+      raise Exception("No conversion possible.")
 
     elif datasets[d_idx] not in data_supported:
       datasets[d_idx] = data_supported
@@ -370,7 +1138,9 @@ def label_decoder(predicted_labels, label_map):
   return predicted_labels
 
 '''
-Implementation of various metrics common to all classifiers.
+Implementation of various metrics common to all classifiers. The metrics are
+computed with vectorized numpy operations on the confusion matrix; use
+Evaluate() to compute all of them in a single pass.
 '''
 class Metrics(object):
 
@@ -380,12 +1150,80 @@ class Metrics(object):
   Create the confusion matrix from the two arrays containing the true labels and
   the predicted labels. The confusion matrix contains all information about the
   number of true and false positives and negatives for all the classes in
-  consideration.
+  consideration. The rows and columns are ordered by the sorted union of the
+  true and the predicted labels.
   '''
   @staticmethod
   def ConfusionMatrix(labels, prediction):
-    from sklearn.metrics import confusion_matrix
-    return confusion_matrix(labels, prediction)
+    labels = np.asarray(labels).ravel()
+    prediction = np.asarray(prediction).ravel()
+    if len(labels) != len(prediction):
+      raise ValueError("Found %d labels but %d predictions." % (len(labels),
+        len(prediction)))
+
+    classes, index = np.unique(np.concatenate((labels, prediction)),
+      return_inverse=True)
+    l = len(classes)
+    return np.bincount(index[:len(labels)] * l + index[len(labels):],
+      minlength=l * l).reshape(l, l)
+
+  '''
+  @param CM - The confusion matrix
+  Return the number of true positives, false positives, false negatives and
+  true negatives of every class, obtained by applying the One vs All approach.
+  '''
+  @staticmethod
+  def ClassCounts(CM):
+    CM = np.asarray(CM)
+    truePositives = np.diagonal(CM)
+    falsePositives = CM.sum(axis=0) - truePositives
+    falseNegatives = CM.sum(axis=1) - truePositives
+    trueNegatives = CM.sum() - truePositives - falsePositives - falseNegatives
+    return truePositives, falsePositives, falseNegatives, trueNegatives
+
+  '''
+  @param CM - The confusion matrix
+  Compute the precision, recall, FMeasure, lift and MCC of every class from
+  the per-class counts, which are derived only once.
+  @return Dict with the arrays of the per-class measures.
+  '''
+  @staticmethod
+  def ClassScores(CM):
+    CM = np.asarray(CM)
+    # Compute in floating point, the MCC products overflow 64 bit integers for
+    # large test sets.
+    truePositives, falsePositives, falseNegatives, trueNegatives = [
+      counts.astype(np.float64) for counts in Metrics.ClassCounts(CM)]
+    totalPositives = truePositives + falsePositives
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+      # A class without predictions is not relevant: all instances are
+      # predicted as negative and there are no spurious cases.
+      precision = np.where(totalPositives != 0,
+        truePositives / totalPositives, 1.0)
+      recall = truePositives / (truePositives + falseNegatives)
+
+      # The edge case of precision and recall both 0.
+      fMeasure = np.where(precision + recall != 0,
+        2 * precision * recall / (precision + recall),
+        2 * truePositives / (2 * truePositives + falsePositives +
+        falseNegatives))
+
+      # The share of the total above the threshold is taken from the first
+      # column for all classes.
+      lift = (truePositives / (truePositives + falseNegatives)) / (
+        CM[:, 0].sum() / CM.sum())
+
+      Numerator = (truePositives*trueNegatives) - (falsePositives*falseNegatives)
+      Denominator = np.sqrt((truePositives + falsePositives)*
+                            (truePositives + falseNegatives)*
+                            (trueNegatives + falsePositives)*
+                            (trueNegatives + falseNegatives))
+      # The limiting case of a class that is not relevant.
+      mcc = np.where(Denominator != 0, Numerator / Denominator, 0.0)
+
+    return {"Precision": precision, "Recall": recall, "FMeasure": fMeasure,
+      "Lift": lift, "MCC": mcc}
 
   '''
   @param CM - The confusion matrix
@@ -412,17 +1250,9 @@ class Metrics(object):
   '''
   @staticmethod
   def AverageAccuracy(CM):
-    acc=0.0
-    Sum=0
-    l=len(CM)
-    for i in range(l):
-        for j in range(l):
-            Sum+=CM[i][j]
-        acc = acc + (float(CM[i][i])/float(Sum))*100.0
-        Sum=0
-    acc = acc/l
-    return acc/100.0
-
+    CM = np.asarray(CM)
+    with np.errstate(divide="ignore", invalid="ignore"):
+      return float(np.mean(np.diagonal(CM) / CM.sum(axis=1)))
 
   '''
   @param class_i - Index of the class in the confusion matrix
@@ -433,20 +1263,7 @@ class Metrics(object):
   '''
   @staticmethod
   def PrecisionForAClass(class_i,CM):
-    l=len(CM)
-    truePositives = CM[class_i][class_i]
-    falsePositives = 0
-    for j in range(l):
-        falsePositives+=CM[j][class_i]
-    falsePositives-=truePositives
-    totalPositives = truePositives + falsePositives
-    if totalPositives != 0:
-      precision = truePositives/totalPositives
-    else:
-      #The class is not relevant (no predictions in this class)
-      #All instances predicted as negative, no spurious cases
-      precision = 1
-    return precision
+    return Metrics.ClassScores(CM)["Precision"][class_i]
 
   '''
   @param class_i - Index of the class in the confusion matrix
@@ -457,15 +1274,7 @@ class Metrics(object):
   '''
   @staticmethod
   def RecallForAClass(class_i,CM):
-     l=len(CM)
-     truePositives = CM[class_i][class_i]
-     falseNegatives = 0
-     for j in range(l):
-         falseNegatives+=CM[class_i][j]
-     falseNegatives-=truePositives
-     total = truePositives + falseNegatives
-     recall = truePositives/total
-     return recall
+    return Metrics.ClassScores(CM)["Recall"][class_i]
 
   '''
   @param CM - The confusion matrix
@@ -477,21 +1286,11 @@ class Metrics(object):
   '''
   @staticmethod
   def AvgPrecision(CM):
-    l=len(CM)
-    avgPrecision = 0
-    for i in range(l):
-        avgPrecision+=Metrics.PrecisionForAClass(i,CM)
-    avgPrecision = avgPrecision/l
-    return avgPrecision
+    return float(np.mean(Metrics.ClassScores(CM)["Precision"]))
 
   @staticmethod
   def AvgRecall(CM):
-    l=len(CM)
-    avgRecall = 0
-    for i in range(l):
-        avgRecall+=Metrics.RecallForAClass(i,CM)
-    avgRecall = avgRecall/l
-    return avgRecall
+    return float(np.mean(Metrics.ClassScores(CM)["Recall"]))
 
   '''
   @param class_i - Index of the class in the confusion matrix
@@ -500,32 +1299,7 @@ class Metrics(object):
   '''
   @staticmethod
   def FMeasureClass(class_i,CM):
-    l = len(CM)
-    precClass = Metrics.PrecisionForAClass(class_i,CM)
-    recClass = Metrics.RecallForAClass(class_i,CM)
-    if (precClass + recClass) != 0:
-      fMeasure = 2*precClass*recClass/(precClass+recClass)
-    else:
-      #Took care of the edge case here!
-      truePositives = CM[class_i][class_i]
-      falsePositives = 0
-      for j in range(l):
-        falsePositives+=CM[j][class_i]
-      falsePositives-=truePositives
-      falseNegatives=0
-      for j in range(l):
-        falseNegatives+=CM[class_i][j]
-      falseNegatives-=truePositives
-      trueNegatives=0
-      #calculate trueNegatives
-      for i in range(l):
-        if i!=class_i:
-          for j in range(l):
-            trueNegatives+=CM[i][j]
-          trueNegatives-=CM[i][class_i]
-      fMeasure = 2*truePositives / (2*truePositives + falsePositives + falseNegatives)
-    return fMeasure
-
+    return Metrics.ClassScores(CM)["FMeasure"][class_i]
 
   '''
   @param CM - The confusion matrix
@@ -534,12 +1308,7 @@ class Metrics(object):
   '''
   @staticmethod
   def AvgFMeasure(CM):
-    l=len(CM)
-    avgF=0
-    for i in range(l):
-        avgF+=Metrics.FMeasureClass(i,CM)
-    avgF = avgF/l
-    return avgF
+    return float(np.mean(Metrics.ClassScores(CM)["FMeasure"]))
 
   '''
   @param class_i - Index of the class in the confusion matrix
@@ -549,24 +1318,7 @@ class Metrics(object):
   '''
   @staticmethod
   def LiftForAClass(class_i,CM):
-    l=len(CM)
-    #pgt - positives greater than threshold
-    pgt = 0
-    #tgt - total greater than threshold
-    tgt = 0
-    total = 0
-    for i in range(l):
-      pgt = pgt + CM[class_i][i]
-    pgt = (1/pgt) * CM[class_i][class_i]
-    for j in range(l):
-      tgt = tgt + CM[j][0]
-    for i in range(l):
-      for j in range(l):
-        total = total + CM[i][j]
-    tgt = tgt/total
-    lift = pgt/tgt
-    return lift
-
+    return Metrics.ClassScores(CM)["Lift"][class_i]
 
   '''
   @param CM - The confusion matrix
@@ -578,13 +1330,7 @@ class Metrics(object):
   '''
   @staticmethod
   def LiftMultiClass(CM):
-    AvgLift=0
-    l=len(CM)
-    for i in range(l):
-      AvgLift+=Metrics.LiftForAClass(i,CM)
-    AvgLift/=l
-    return AvgLift
-
+    return float(np.mean(Metrics.ClassScores(CM)["Lift"]))
 
   '''
   @param class_i - Index of the class in the confusion matrix
@@ -596,36 +1342,7 @@ class Metrics(object):
   '''
   @staticmethod
   def MatthewsCorrelationCoefficientClass(class_i, CM):
-    l=len(CM)
-    truePositives = CM[class_i][class_i]
-    falsePositives = 0
-    for j in range(l):
-      falsePositives+=CM[j][class_i]
-    falsePositives-=truePositives
-    falseNegatives=0
-    for j in range(l):
-      falseNegatives+=CM[class_i][j]
-    falseNegatives-=truePositives
-    trueNegatives=0
-    #calculate trueNegatives
-    for i in range(l):
-      if i!=class_i:
-        for j in range(l):
-          trueNegatives+=CM[i][j]
-        trueNegatives-=CM[i][class_i]
-    Numerator = (truePositives*trueNegatives) - (falsePositives*falseNegatives)
-    Denominator=math.sqrt((truePositives + falsePositives)*
-                            (truePositives + falseNegatives)*
-                            (trueNegatives + falsePositives)*
-                            (trueNegatives + falseNegatives))
-    if Denominator != 0:
-      MCC = Numerator/Denominator
-    else:
-      #Class is not relevant (no predictions in this class)
-      #The limiting case.
-      MCC = 0
-    return MCC
-
+    return Metrics.ClassScores(CM)["MCC"][class_i]
 
   '''
   @param CM - The confusion matrix
@@ -638,12 +1355,7 @@ class Metrics(object):
   '''
   @staticmethod
   def MCCMultiClass(CM):
-    MCC=0
-    l=len(CM)
-    for i in range(l):
-      MCC+=Metrics.MatthewsCorrelationCoefficientClass(i,CM)
-    MCC/=l
-    return MCC
+    return float(np.mean(Metrics.ClassScores(CM)["MCC"]))
 
   '''
   @param truelabelFile - Name of the file which contains the true label
@@ -733,31 +1445,30 @@ class Metrics(object):
 
   @staticmethod
   def MPIArrayClass(class_i, truelabels, predictedlabels):
-    instances=len(truelabels)
-    predictiveSum=0
-    count=0
-    for i in range(instances):
-      if truelabels[i] == class_i:
-        count+=1
-        '''
-        predictiveSum+=((actual[i] * math.log(predicted[i],2))+
-                          ((1-actual[i]) * math.log(1-predicted[i],2)))
-        We take actual[i] to be 0. Hence, the formula :
-        We take 0.05 instead of absolute 0 and 0.95 instead of absolute 1
-        to guarantee that an absolute 0 value doesn't become an argument
-        to logarithm.
-        '''
-        predicted_val=0.05
-        actual_val=0.05
-        if predictedlabels[i] != truelabels[i]:
-          predicted_val = 0.95
-
-        predictiveSum+=((actual_val*math.log(predicted_val,2)) + (predicted_val*math.log(1 - predicted_val,2)))
+    truelabels = np.asarray(truelabels).ravel()
+    predictedlabels = np.asarray(predictedlabels).ravel()
+    mask = truelabels == class_i
+    count = np.count_nonzero(mask)
+    wrong = np.count_nonzero(predictedlabels[mask] != truelabels[mask])
+    return Metrics.MPIFromCounts(count, wrong)
 
-    if count != 0:
-      predictiveSum/=count
-    predictiveSum+=1
-    return predictiveSum
+  '''
+  @param count - Number of instances of the class
+  @param wrong - Number of mispredicted instances of the class
+  Mean predictive information of a class, computed from the number of correct
+  and wrong predictions of the class. We take actual[i] to be 0 and take 0.05
+  instead of absolute 0 and 0.95 instead of absolute 1 to guarantee that an
+  absolute 0 value doesn't become an argument to logarithm.
+  '''
+  @staticmethod
+  def MPIFromCounts(count, wrong):
+    correctTerm = 0.05 * math.log(0.05, 2) + 0.05 * math.log(1 - 0.05, 2)
+    wrongTerm = 0.05 * math.log(0.95, 2) + 0.95 * math.log(1 - 0.95, 2)
+    predictiveSum = (count - wrong) * correctTerm + wrong * wrongTerm
+    with np.errstate(divide="ignore", invalid="ignore"):
+      predictiveSum = np.where(count != 0, predictiveSum / np.maximum(count, 1),
+        predictiveSum)
+    return predictiveSum + 1
 
   '''
   This method extracts all the labels from the truelabels file in a list
@@ -801,12 +1512,18 @@ class Metrics(object):
   '''
   @staticmethod
   def AvgMPIArray(CM, truelabels, predictedlabels):
-    mpi=0
-    all_labels = Metrics.GetActualLabels(truelabels)
-    for i in range(len(CM)):
-      mpi+=Metrics.MPIArrayClass(all_labels[i], truelabels, predictedlabels)
-    mpi/=len(CM)
-    return mpi
+    truelabels = np.asarray(truelabels).ravel()
+    predictedlabels = np.asarray(predictedlabels).ravel()
+
+    # The classes in the order of their first appearance in the true labels.
+    _, first, index, count = np.unique(truelabels, return_index=True,
+      return_inverse=True, return_counts=True)
+    wrong = np.bincount(index, weights=(predictedlabels != truelabels),
+      minlength=len(count))
+    order = np.argsort(first)
+
+    mpi = Metrics.MPIFromCounts(count[order], wrong[order])
+    return float(np.sum(mpi[np.arange(len(CM))]) / len(CM))
 
   '''
   @param truelabels - Array containing the true labels for the test data
@@ -817,10 +1534,38 @@ class Metrics(object):
   '''
   @staticmethod
   def SimpleMeanSquaredError(truelabels, predictedlabels):
-    simplemse = 0
-    n = len(truelabels)
-    for i in range(n):
-      difference = truelabels[i] - predictedlabels[i]
-      simplemse += difference * difference
-    simplemse /= n
-    return simplemse
+    truelabels = np.asarray(truelabels)
+    predictedlabels = np.asarray(predictedlabels)
+    if truelabels.shape != predictedlabels.shape:
+      truelabels = truelabels.ravel()
+      predictedlabels = predictedlabels.ravel()
+
+    difference = truelabels - predictedlabels
+    return np.sum(difference * difference, axis=0) / len(truelabels)
+
+  '''
+  @param truelabels - Array containing the true labels for the test data
+  @param predictedlabels - Array containing the predicted labels for test data
+  Compute all classifier metrics in a single pass: the confusion matrix and
+  the per-class counts are computed only once.
+  @return Dict with the ACC, MCC, Precision, Recall, FMeasure, Lift,
+          Information and MSE metrics.
+  '''
+  @staticmethod
+  def Evaluate(truelabels, predictedlabels):
+    CM = Metrics.ConfusionMatrix(truelabels, predictedlabels)
+    scores = Metrics.ClassScores(CM)
+
+    metric = {}
+    metric['ACC'] = Metrics.AverageAccuracy(CM)
+    for name in ['MCC', 'Precision', 'Recall', 'FMeasure', 'Lift']:
+      metric[name] = float(np.mean(scores[name]))
+    try:
+      metric['Information'] = Metrics.AvgMPIArray(CM, truelabels,
+        predictedlabels)
+    except IndexError:
+      # Some classes only appear in the predictions.
+      pass
+    metric['MSE'] = Metrics.SimpleMeanSquaredError(truelabels,
+      predictedlabels)
+    return metric
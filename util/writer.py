@@ -0,0 +1,198 @@
+'''
+  @file writer.py
+
+  Background writer that passes the results to the output driver.
+'''
+
+import os
+import json
+import time
+import queue
+import logging
+import threading
+
+'''
+This class passes the results to the output driver on a background thread, so
+a slow database never delays the next benchmark run. Every result is appended
+to a spool file (and synced to disk) before it is queued, and marked as done
+once the driver flushed it. The driver is flushed when 'batch_size' results
+are pending, when the oldest pending result is older than 'flush_interval'
+seconds (both attributes of the driver, drivers without them are flushed after
+every result) and when the writer is closed. The results of a crashed
+benchmark invocation that are still in the spool are written by the next
+invocation. When the queue is full, put() blocks until the driver caught up.
+'''
+class ResultWriter(object):
+
+  '''
+  Create the writer and write the results left in the spool file.
+
+  @param driver - The output driver.
+  @param spool - The path of the spool file.
+  @param size - The maximum number of queued results.
+  '''
+  def __init__(self, driver, spool, size=64):
+    self.driver = driver
+    self.path = spool
+    self.queue = queue.Queue(maxsize=max(1, int(size)))
+    self.lock = threading.Lock()
+    self.sequence = 0
+    self.pending = []
+    self.pending_time = None
+    self.batch_size = max(1, int(getattr(driver, "batch_size", 1)))
+    self.flush_interval = float(getattr(driver, "flush_interval", 0))
+    self.failed = 0
+
+    # A result the driver flushes by itself inside of update() is never marked
+    # as done, so the writer owns the batching of the driver.
+    if hasattr(driver, "autoflush"):
+      driver.autoflush = False
+
+    self.replay()
+
+    self.spool = open(self.path, "a")
+    self.thread = threading.Thread(target=self.work, name="ResultWriter",
+      daemon=True)
+    self.thread.start()
+
+  '''
+  Queue the given result for the driver, block if the queue is full.
+  '''
+  def put(self, library, method, datasets, method_param, base_param, result):
+    self.sequence += 1
+    record = {"build": self.driver.build, "library": library,
+      "method": method, "datasets": datasets, "method_param": method_param,
+      "base_param": base_param, "result": result}
+    self.write({"sequence": self.sequence, "record": record}, sync=True)
+
+    if self.queue.full():
+      logging.info('Waiting for the output driver.')
+    self.queue.put((self.sequence, record))
+
+  '''
+  Write the queued results until close() is called.
+  '''
+  def work(self):
+    while True:
+      # Wake up when the oldest pending result is due.
+      timeout = None
+      if self.pending_time is not None:
+        timeout = max(0, self.pending_time + self.flush_interval -
+          time.monotonic())
+
+      try:
+        item = self.queue.get(timeout=timeout)
+      except queue.Empty:
+        item = False
+      if item is None:
+        break
+
+      try:
+        if item:
+          sequence, record = item
+          self.update(record)
+          self.pending.append(sequence)
+          if self.pending_time is None:
+            self.pending_time = time.monotonic()
+
+        if self.pending and (len(self.pending) >= self.batch_size or
+            time.monotonic() - self.pending_time >= self.flush_interval):
+          self.flush()
+      except Exception as e:
+        self.failed += 1
+        logging.error('Output driver: %s, the result is kept in %s.' % (
+          str(e), self.path))
+        # Retry the pending results with the next batch or on close().
+        self.pending_time = None
+
+  '''
+  Pass the given spooled record to the driver, with the build number of the
+  benchmark invocation that produced it.
+  '''
+  def update(self, record):
+    build, self.driver.build = self.driver.build, record["build"]
+    try:
+      self.driver.update(record["library"], record["method"],
+        record["datasets"], record["method_param"], record["base_param"],
+        record["result"])
+    finally:
+      self.driver.build = build
+
+  '''
+  Flush the driver and mark the flushed results as done.
+  '''
+  def flush(self):
+    self.driver.flush()
+    for sequence in self.pending:
+      self.write({"done": sequence})
+    self.pending = []
+    self.pending_time = None
+
+  '''
+  Append the given entry to the spool file.
+  '''
+  def write(self, entry, sync=False):
+    with self.lock:
+      self.spool.write(json.dumps(entry, default=str) + "\n")
+      self.spool.flush()
+      if sync:
+        os.fsync(self.spool.fileno())
+
+  '''
+  Write the results left in the spool file by a previous invocation.
+  '''
+  def replay(self):
+    if not os.path.isfile(self.path):
+      return
+
+    records = {}
+    with open(self.path, "r") as fid:
+      for line in fid:
+        try:
+          entry = json.loads(line)
+        except ValueError:
+          # The last line of a crashed invocation may be incomplete.
+          continue
+        if "done" in entry:
+          records.pop(entry["done"], None)
+        elif "sequence" in entry:
+          records[entry["sequence"]] = entry["record"]
+          self.sequence = max(self.sequence, entry["sequence"])
+
+    try:
+      if records:
+        logging.info('Writing %d results of a previous benchmark from %s.' % (
+          len(records), self.path))
+        for sequence in sorted(records):
+          self.update(records[sequence])
+        self.driver.flush()
+    except Exception as e:
+      # Keep the spool file, the new results are appended to it.
+      self.failed += 1
+      logging.error('Output driver: %s, the results are kept in %s.' % (
+        str(e), self.path))
+      return
+
+    os.remove(self.path)
+
+  '''
+  Write the queued results, close the driver and remove the spool file if all
+  results were written.
+  '''
+  def close(self):
+    self.queue.put(None)
+    self.thread.join()
+
+    try:
+      self.flush()
+      self.driver.close()
+    except Exception as e:
+      self.failed += 1
+      logging.error('Output driver: %s' % (str(e)))
+
+    self.spool.close()
+    if self.failed:
+      logging.error('%d results are kept in %s and will be written by the '
+        'next benchmark.' % (self.failed, self.path))
+    else:
+      os.remove(self.path)